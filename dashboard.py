@@ -8,14 +8,16 @@ Air Quality Dashboard - Overlay Gap (no spacer column)
 """
 import tkinter as tk
 from tkinter import ttk
-import matplotlib
-matplotlib.rcParams['font.family'] = 'DejaVu Sans'
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
-from datetime import datetime
-import serial
+import numpy as np   # เบากว่า matplotlib มาก และโดน matplotlib ลากมาอยู่ดี
+import os
+import queue
+import threading
+import time
 from typing import Optional
 
+# ของที่ซ้ำกับ test/dashboard.py ย้ายไปไฟล์กลาง — parse/compile ชุดเดียว
+from dashboard_common import PMSReader, RelayController, pm25_category
+
 INDOOR_PORT = "/dev/ttyAMA0"
 OUTDOOR_PORT = "/dev/ttyAMA2"
 BAUDRATE = 9600
@@ -25,32 +27,11 @@ ACTIVE_LOW = True
 RELAY_PINS = [17, 18, 27, 22]
 RELAY_NAMES = {17: "Purifier", 18: "Fan", 27: "Vent", 22: "Spare"}
 
-try:
-    from gpiozero import DigitalOutputDevice as _GpioZeroDevice, Device
-    try:
-        from gpiozero.pins.lgpio import LGPIOFactory
-        Device.pin_factory = LGPIOFactory()
-        _gpiozero_backend_name = 'lgpio'
-    except Exception:
-        _gpiozero_backend_name = 'auto'
-    _gpiozero_available = True
-except Exception as e:
-    print(f"[WARN] gpiozero not available: {e}")
-    _gpiozero_available = False
-    Device = None
-
-try:
-    import RPi.GPIO as GPIO
-    GPIO.setwarnings(False)
-    _rpi_gpio_available = True
-except Exception as e:
-    print(f"[WARN] RPi.GPIO not available: {e}")
-    _rpi_gpio_available = False
-    GPIO = None
+CSV_DIR = "csv_logs"   # โฟลเดอร์ log รายวันของ backend.py (ใช้เติมกราฟตอนเปิด)
 
 UI_UPDATE_MS = 600
 HISTORY_MAX = 180
-CHART_EVERY_N_TICKS = 2
+CHART_EVERY_N_TICKS = 3   # การ์ดตัวเลข/auto ยังอัปเดตทุก tick; กราฟวาดทุก ~1.8s พอ
 
 COL_BG = "#0B0F1A"
 COL_SURFACE = "#121826"
@@ -66,20 +47,11 @@ COL_VBAD = "#8e44ad"
 COL_HAZ = "#7f0000"
 GRID_COLOR = "#38465a"
 
-PM25_BANDS = [
-    (0.0, 12.0, "Good", COL_OK),
-    (12.1, 35.4, "Moderate", COL_WARN),
-    (35.5, 55.4, "USG", COL_USG),
-    (55.5, 150.4, "Unhealthy", COL_BAD),
-    (150.5, 250.4, "Very Unhealthy", COL_VBAD),
-    (250.5, float("inf"), "Hazardous", COL_HAZ),
-]
-
 def pm25_band(value: float):
-    for lo, hi, label, color in PM25_BANDS:
-        if lo <= (value if value is not None else -1) <= hi:
-            return label, color
-    return "-", COL_TEXT_MUTED
+    label, color = pm25_category(value)
+    if label == "-":
+        return label, COL_TEXT_MUTED  # ธีมนี้ใช้สี muted ของตัวเอง
+    return label, color
 
 def _hex_to_rgb(h: str):
     h = h.lstrip('#')
@@ -96,150 +68,6 @@ def mix_color(fg: str, bg: str, t: float = 0.30) -> str:
     b = int(b1*t + b2*(1-t))
     return _rgb_to_hex((r, g, b))
 
-class RelayController:
-    def __init__(self, pins, active_low=True):
-        self.pins = list(pins)
-        self.active_low = bool(active_low)
-        self.states = {p: False for p in pins}
-        self.backend = None
-        self._devices = {}
-        if _gpiozero_available:
-            try:
-                for p in pins:
-                    dev = _GpioZeroDevice(p, active_high=(not self.active_low), initial_value=False)
-                    self._devices[p] = dev
-                self.backend = 'gpiozero'
-                print(f"[GPIO] Using gpiozero backend ({_gpiozero_backend_name})")
-            except Exception as e:
-                print(f"[WARN] gpiozero init failed: {e}")
-                self.backend = None
-        if self.backend is None and _rpi_gpio_available:
-            try:
-                GPIO.setmode(GPIO.BCM)
-                for p in pins:
-                    GPIO.setup(p, GPIO.OUT)
-                for p in pins:
-                    self._apply_pin_rpigpio(p, False)
-                self.backend = 'RPi.GPIO'
-                print('[GPIO] Using RPi.GPIO backend')
-            except Exception as e:
-                print(f"[WARN] RPi.GPIO init failed: {e}")
-                self.backend = None
-        if self.backend is None:
-            self.backend = 'mock'
-            print('[GPIO] Using MOCK backend (no hardware)')
-
-    def _apply_pin_gpiozero(self, pin, state):
-        dev = self._devices.get(pin)
-        if dev:
-            dev.on() if state else dev.off()
-        self.states[pin] = state
-
-    def _apply_pin_rpigpio(self, pin, state):
-        if self.active_low:
-            level = GPIO.LOW if state else GPIO.HIGH
-        else:
-            level = GPIO.HIGH if state else GPIO.LOW
-        GPIO.output(pin, level)
-        self.states[pin] = state
-
-    def _apply_pin(self, pin, state):
-        if self.backend == 'gpiozero':
-            self._apply_pin_gpiozero(pin, state)
-        elif self.backend == 'RPi.GPIO':
-            self._apply_pin_rpigpio(pin, state)
-        else:
-            print(f"[MOCK GPIO] Pin {pin} -> {'ON' if state else 'OFF'}")
-            self.states[pin] = state
-
-    def set(self, pin, state: bool):
-        if pin in self.pins:
-            self._apply_pin(pin, bool(state))
-
-    def toggle(self, pin):
-        self.set(pin, not self.states.get(pin, False))
-
-    def set_all(self, state: bool):
-        for p in self.pins:
-            self._apply_pin(p, bool(state))
-
-    def cleanup(self):
-        try:
-            if self.backend == 'gpiozero':
-                for dev in self._devices.values():
-                    try: dev.off()
-                    except: pass
-                    try: dev.close()
-                    except: pass
-                try:
-                    if Device and getattr(Device, "pin_factory", None):
-                        Device.pin_factory.close()
-                except Exception as e:
-                    print(f"[WARN] pin_factory.close() failed: {e}")
-            elif self.backend == 'RPi.GPIO':
-                try:
-                    for p in self.pins:
-                        self._apply_pin_rpigpio(p, False)
-                except Exception: pass
-                try:
-                    GPIO.cleanup()
-                except Exception: pass
-        except Exception:
-            pass
-
-class PMSReader:
-    def __init__(self, port: str):
-        try:
-            self.ser = serial.Serial(port, baudrate=BAUDRATE, timeout=TIMEOUT)
-            try: self.ser.reset_input_buffer()
-            except: pass
-            self.buf = bytearray()
-            self.last = {"pm1": 0.0, "pm25": 0.0, "pm10": 0.0}
-            self.ok = True
-        except Exception as e:
-            print(f"[WARN] Cannot open serial {port}: {e}")
-            self.ser = None
-            self.ok = False
-
-    def _parse_frames(self):
-        i = 0
-        while True:
-            j = self.buf.find(b'\x42\x4D', i)
-            if j < 0:
-                if len(self.buf) > 1:
-                    self.buf = self.buf[-1:]
-                break
-            if len(self.buf) - j < 32:
-                if j > 0:
-                    self.buf = self.buf[j:]
-                break
-            frame = self.buf[j:j+32]
-            self.buf = self.buf[j+32:]
-            if frame[0] == 0x42 and frame[1] == 0x4D:
-                pm1  = int.from_bytes(frame[10:12], 'big')
-                pm25 = int.from_bytes(frame[12:14], 'big')
-                pm10 = int.from_bytes(frame[14:16], 'big')
-                self.last = {"pm1": float(pm1), "pm25": float(pm25), "pm10": float(pm10)}
-            i = 0
-
-    def read_once(self):
-        if not self.ok:
-            return self.last
-        try:
-            n = self.ser.in_waiting
-            if n:
-                self.buf += self.ser.read(n)
-                self._parse_frames()
-        except Exception as e:
-            print(f"[WARN] Serial read error: {e}")
-        return self.last
-
-    def close(self):
-        try:
-            if self.ser: self.ser.close()
-        except Exception:
-            pass
-
 class EnvReader:
     def __init__(self, addr=0x76):
         self.addr = addr
@@ -333,12 +161,21 @@ class StatCard(ttk.Frame):
         self.title.pack(anchor="w")
         self.value.pack(anchor="w")
         self.unit = unit
+        # ผูก format ไว้ล่วงหน้า ไม่ต้องประกอบ f-string ใหม่ทุก tick
+        self._fmt = ("{:.1f} " + unit).format
+        self._none_text = f"- {unit}"
+        self._last_val = object()  # sentinel — ต่างจากทุกค่าจริงรวมถึง None
 
     def set(self, val: Optional[float]):
+        if val is not None:
+            val = round(val, 1)  # ความละเอียดเท่าที่แสดงจริง — กัน jitter ทศนิยมลึก ๆ
+        if val == self._last_val:
+            return  # ข้อความบนจอเท่าเดิม — ไม่ต้องให้ Tk วัด/วาดใหม่
+        self._last_val = val
         if val is None:
-            self.value.configure(text=f"- {self.unit}")
+            self.value.configure(text=self._none_text)
         else:
-            self.value.configure(text=f"{val:.1f} {self.unit}")
+            self.value.configure(text=self._fmt(val))
 
 class Section(ttk.Labelframe):
     """NOW 3 columns (no spacer)."""
@@ -370,16 +207,41 @@ class PMDashboard:
         self.root.geometry("1280x900")
         self._setup_style()
 
-        self.reader_indoor = PMSReader(INDOOR_PORT)
-        self.reader_outdoor = PMSReader(OUTDOOR_PORT)
+        self.reader_indoor = PMSReader(INDOOR_PORT, baudrate=BAUDRATE, timeout=TIMEOUT)
+        self.reader_outdoor = PMSReader(OUTDOOR_PORT, baudrate=BAUDRATE, timeout=TIMEOUT)
         self.env = EnvReader(addr=0x76)
 
+        # โพล serial บน thread แยก (ตามจังหวะเซนเซอร์ ~1Hz) — Tk แค่หยิบค่าล่าสุดจากคิว
+        self._stop_readers = threading.Event()
+        self.q_indoor = queue.Queue(maxsize=1)
+        self.q_outdoor = queue.Queue(maxsize=1)
+        self._last_indoor = dict(self.reader_indoor.last)
+        self._last_outdoor = dict(self.reader_outdoor.last)
+        for reader, q in ((self.reader_indoor, self.q_indoor),
+                          (self.reader_outdoor, self.q_outdoor)):
+            threading.Thread(target=self._reader_loop, args=(reader, q),
+                             daemon=True, name=f"pms-{reader.__class__.__name__}").start()
+        # BME280 ผ่าน I2C ก็บล็อกได้เหมือนกัน — แยก thread แล้วสลับ dict ล่าสุด
+        # (assignment เดียว atomic พอสำหรับฝั่ง Tk ที่แค่อ่าน)
+        self._last_env = {"temp": None, "humid": None, "press": None}
+        threading.Thread(target=self._env_loop, daemon=True, name="env-reader").start()
+
         self.relays = RelayController(RELAY_PINS, active_low=ACTIVE_LOW)
 
+        self._last_vals = {}   # id(section) -> (pm1, pm25, pm10) ที่แสดงล่าสุด
         self.auto_enabled = tk.BooleanVar(value=False)
         self.auto_source = tk.StringVar(value="Indoor")
         self.auto_on_threshold = tk.DoubleVar(value=35.0)
         self.auto_hysteresis = tk.DoubleVar(value=5.0)
+        # cache ค่าจาก Tk variable ไว้เป็น Python ธรรมดา อัปเดตเฉพาะตอนผู้ใช้แก้
+        # (.get() ข้ามไป Tcl ทุกครั้ง — ไม่ควรจ่ายใน _auto_control ทุก tick)
+        self._auto_enabled = False
+        self._auto_src = "Indoor"
+        self._th = 35.0
+        self._hy = 5.0
+        for var in (self.auto_enabled, self.auto_source,
+                    self.auto_on_threshold, self.auto_hysteresis):
+            var.trace_add("write", self._refresh_auto_params)
 
         top = ttk.Frame(root, padding=(16, 12), style="Top.TFrame"); top.pack(fill="x")
         self.title_lbl = ttk.Label(top, text="Indoor & Outdoor Air Quality", style="Title.TLabel")
@@ -408,10 +270,33 @@ class PMDashboard:
         self.chart_card.pack_propagate(False)
 
         ttl = ttk.Label(self.chart_card, text="PM2.5 Exceedances (last ~100s)", style="Muted.TLabel"); ttl.pack(anchor="w")
-        self.indoor_history, self.outdoor_history, self.time_history = [], [], []
-        self.fig = plt.Figure(figsize=(8, 3.6), facecolor=COL_SURFACE)
+        # ring buffer บน numpy: จองที่ครั้งเดียว เขียนทับด้วย index วน
+        # ไม่มี append/pop ไม่มี realloc และส่งเข้า set_data ได้ตรง ๆ
+        self._hist_in = np.zeros(HISTORY_MAX, dtype=np.float32)
+        self._hist_out = np.zeros(HISTORY_MAX, dtype=np.float32)
+        self._hist_x = np.arange(HISTORY_MAX)
+        self._hist_idx = 0
+        self._hist_n = 0
+        # scratch สำหรับเรียงหน้าต่างตามเวลา — ใช้ซ้ำทุก draw ไม่ alloc ใหม่
+        self._plot_in = np.empty(HISTORY_MAX, dtype=np.float32)
+        self._plot_out = np.empty(HISTORY_MAX, dtype=np.float32)
+        self._seed_history_from_csv()
+        # matplotlib หนักสุดของ cold start (หลายวินาทีบน Pi) — import ตรงนี้
+        # ให้หน้าต่าง Tk กับการ์ดตัวเลขขึ้นก่อน แล้วค่อยจ่ายค่ากราฟ
+        import matplotlib
+        matplotlib.rcParams['font.family'] = 'DejaVu Sans'
+        # เส้นยาว 180 จุด: simplify แรงขึ้น + chunk ใหญ่ขึ้น ลดงาน Agg ต่อ draw
+        matplotlib.rcParams.update({'path.simplify': True,
+                                    'path.simplify_threshold': 1.0,
+                                    'agg.path.chunksize': 1000})
+        # ใช้ Figure ตรง ๆ ไม่ผ่าน pyplot — ไม่ต้องแบก state machine/figure
+        # manager ของ pyplot ที่ import มาแล้วไม่ได้ใช้
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+        from matplotlib.figure import Figure
+        self.fig = Figure(figsize=(8, 3.6), facecolor=COL_SURFACE)
         self.fig.subplots_adjust(left=0.08, right=0.98, top=0.95, bottom=0.20)
         self.ax = self.fig.add_subplot(111)
+        self._setup_axes()
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.chart_card)
         self.canvas_widget = self.canvas.get_tk_widget()
         self.canvas_widget.pack(fill="both", expand=True)
@@ -430,14 +315,19 @@ class PMDashboard:
         ttk.Label(ctrl, text="Hysteresis (µg/m³):", style="Muted.TLabel").grid(row=0, column=5, sticky="e", padx=(12,4))
         ttk.Spinbox(ctrl, from_=0, to=100, increment=1, textvariable=self.auto_hysteresis, width=6).grid(row=0, column=6, sticky="w")
         self.auto_state_lbl = ttk.Label(ctrl, text="Auto state: idle", style="Caption.TLabel"); self.auto_state_lbl.grid(row=0, column=11, sticky="e")
+        self._auto_last_txt = "Auto state: idle"
+        self._auto_last_t = 0.0
 
         relay_box = ttk.Labelframe(root, text="Relay Controls", padding=12, style="Group.TLabelframe")
         relay_box.pack(fill="x", padx=12, pady=(0,12))
         for i in range(len(RELAY_PINS) + 3): relay_box.columnconfigure(i, weight=1)
         self.relay_btns = {}
+        self._last_btn_state = {pin: False for pin in RELAY_PINS}  # ปุ่มเริ่มที่ OFF
+        self._btn_text = {}   # pin -> (ข้อความ ON, ข้อความ OFF) ประกอบไว้ล่วงหน้า
         for idx, pin in enumerate(RELAY_PINS):
             name = RELAY_NAMES.get(pin, f"Pin {pin}")
-            b = ttk.Button(relay_box, text=f"{name}: OFF", command=lambda p=pin: self._toggle_relay(p))
+            self._btn_text[pin] = (f"{name}: ON", f"{name}: OFF")
+            b = ttk.Button(relay_box, text=self._btn_text[pin][1], command=lambda p=pin: self._toggle_relay(p))
             b.grid(row=0, column=idx, padx=6, pady=6, sticky="ew"); self.relay_btns[pin] = b
         ttk.Button(relay_box, text="All ON", command=lambda: self._set_all_relays(True)).grid(row=0, column=len(RELAY_PINS), padx=6, pady=6, sticky="ew")
         ttk.Button(relay_box, text="All OFF", command=lambda: self._set_all_relays(False)).grid(row=0, column=len(RELAY_PINS)+1, padx=6, pady=6, sticky="ew")
@@ -473,6 +363,27 @@ class PMDashboard:
         style.configure("TProgressbar", troughcolor=COL_SURFACE_MUTED, background=COL_ACCENT,
                         bordercolor=COL_SURFACE_MUTED, lightcolor=COL_ACCENT, darkcolor=COL_ACCENT)
 
+    def _reader_loop(self, reader, q):
+        """producer: รอข้อมูลจริงด้วย select แล้ววางค่าล่าสุดลงคิว (เก็บตัวเดียว)"""
+        while not self._stop_readers.is_set():
+            if not reader.wait(0.5):
+                continue  # หมดเวลารอ/พอร์ตใช้ไม่ได้ — วนเช็ค stop flag
+            data = reader.read_once()
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                q.put_nowait(dict(data))
+            except queue.Full:
+                pass
+
+    def _env_loop(self):
+        """producer: โพล BME280/BMP280 นอก main loop — I2C ช้าไม่สะดุด UI"""
+        while not self._stop_readers.is_set():
+            self._last_env = self.env.read_once()
+            time.sleep(2.0)
+
     def _on_timer(self):
         if not self._running or not self.root.winfo_exists():
             return
@@ -485,6 +396,70 @@ class PMDashboard:
                 except Exception:
                     pass
 
+    def _seed_history_from_csv(self):
+        """เติมกราฟด้วยท้ายไฟล์ CSV รายวันของ backend.py (ถ้ามี) ตอนเปิดโปรแกรม
+        อ่านเฉพาะท้ายไฟล์ด้วยการ seek ถอยหลังทีละ 4KB — ไม่ไล่ parse ทั้งไฟล์"""
+        path = os.path.join(CSV_DIR, time.strftime("%Y-%m-%d") + ".csv")
+        try:
+            with open(path, "rb") as f:
+                f.seek(0, os.SEEK_END)
+                size = f.tell()
+                data = b""
+                while size > 0 and data.count(b"\n") <= HISTORY_MAX:
+                    n = min(4096, size)
+                    size -= n
+                    f.seek(size)
+                    data = f.read(n) + data
+        except OSError:
+            return  # ยังไม่มีไฟล์ของวันนี้ — เริ่มกราฟว่างตามปกติ
+        lines = data.split(b"\n")
+        if size > 0:
+            lines = lines[1:]  # บรรทัดแรกอาจโดนตัดกลางคำ
+        if lines and not lines[-1]:
+            lines.pop()  # ไฟล์จบด้วย newline — split ทิ้ง element ว่างไว้ท้าย กินโควตาไป 1 แถว
+        for raw in lines[-HISTORY_MAX:]:
+            # คอลัมน์: ts_iso, in_PM1, in_PM2.5, in_PM10, out_PM1, out_PM2.5, ...
+            parts = raw.decode("utf-8", "ignore").split(",")
+            if len(parts) < 6 or parts[0].startswith("timestamp"):
+                continue
+            try:
+                pm_in = float(parts[2]); pm_out = float(parts[5])
+            except ValueError:
+                continue
+            if pm_in != pm_in or pm_out != pm_out:  # nan ใน log
+                continue
+            self._hist_append(pm_in, pm_out)
+
+    def _hist_window(self, src, out):
+        """คัดลอกหน้าต่างเรียงตามเวลาเข้า scratch ที่จองไว้ (สอง slice copy)
+        แทน np.roll ที่จองอาร์เรย์ใหม่ทุกรอบวาด คืน view เฉพาะช่องที่มีข้อมูล"""
+        n = self._hist_n
+        i = self._hist_idx
+        if n < HISTORY_MAX:
+            out[:n] = src[:n]   # ยังไม่วน: 0..n-1 เรียงเวลาอยู่แล้ว
+        else:
+            k = HISTORY_MAX - i
+            out[:k] = src[i:]
+            out[k:] = src[:i]
+        return out[:n]
+
+    def _hist_append(self, pm_in, pm_out):
+        i = self._hist_idx
+        self._hist_in[i] = pm_in
+        self._hist_out[i] = pm_out
+        self._hist_idx = (i + 1) % HISTORY_MAX
+        if self._hist_n < HISTORY_MAX:
+            self._hist_n += 1
+
+    def _refresh_auto_params(self, *args):
+        self._auto_enabled = bool(self.auto_enabled.get())
+        self._auto_src = self.auto_source.get()
+        try:
+            self._th = float(self.auto_on_threshold.get())
+            self._hy = float(self.auto_hysteresis.get())
+        except (tk.TclError, ValueError):
+            pass  # พิมพ์ค้างกลางคัน — ใช้ค่าเดิมไปก่อน
+
     def _toggle_relay(self, pin):
         self.relays.toggle(pin); self._refresh_relay_text(pin)
 
@@ -493,10 +468,17 @@ class PMDashboard:
         for pin in RELAY_PINS: self._refresh_relay_text(pin)
 
     def _refresh_relay_text(self, pin):
-        state = self.relays.states.get(pin, False); name = RELAY_NAMES.get(pin, f"Pin {pin}")
-        self.relay_btns[pin].config(text=f"{name}: {'ON' if state else 'OFF'}")
+        state = self.relays.states.get(pin, False)
+        if state == self._last_btn_state.get(pin):
+            return  # ปุ่มแสดงสถานะนี้อยู่แล้ว ไม่ต้องให้ Tk วัด/วาดใหม่
+        self._last_btn_state[pin] = state
+        self.relay_btns[pin].config(text=self._btn_text[pin][0 if state else 1])
 
     def _update_section(self, section: 'Section', data: dict):
+        key = (data['pm1'], data['pm25'], data['pm10'])
+        if self._last_vals.get(id(section)) == key:
+            return  # ค่าซ้ำเดิม ไม่ต้องรบกวน Tk
+        self._last_vals[id(section)] = key
         section.hero.update(data['pm25'], unit="µg/m³")
         section.pm1.set(data['pm1'])
         section.pm25.set(data['pm25'])
@@ -513,102 +495,159 @@ class PMDashboard:
         section.press.set(env.get('press'))
 
     def update_data(self):
-        indoor = self.reader_indoor.read_once()
-        outdoor = self.reader_outdoor.read_once()
-        env = self.env.read_once()
+        try:
+            self._last_indoor = self.q_indoor.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self._last_outdoor = self.q_outdoor.get_nowait()
+        except queue.Empty:
+            pass
+        indoor = self._last_indoor
+        outdoor = self._last_outdoor
+        env = self._last_env
 
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        # อ่านนาฬิกา/format ครั้งเดียว แล้ว slice เอาส่วน HH:MM:SS
+        # time.strftime ไม่ต้องสร้าง datetime object ทุก tick
+        ts = time.strftime("%Y-%m-%d %H:%M:%S")
         self.time_lbl.configure(text=ts)
 
         self._update_section(self.indoor, indoor)
         self._update_section(self.outdoor, outdoor)
         self._update_climate(self.indoor, env)
 
-        current_time = datetime.now().strftime("%H:%M:%S")
-        self.time_history.append(current_time)
-        self.indoor_history.append(indoor['pm25'])
-        self.outdoor_history.append(outdoor['pm25'])
-        if len(self.time_history) > HISTORY_MAX:
-            self.time_history.pop(0); self.indoor_history.pop(0); self.outdoor_history.pop(0)
+        self._hist_append(indoor['pm25'], outdoor['pm25'])
 
         self._tick = getattr(self, "_tick", 0) + 1
         if self._tick % CHART_EVERY_N_TICKS == 0:
             self._draw_chart()
         self._auto_control(indoor, outdoor)
 
-    def _draw_chart(self):
-        self.fig.clf()
-        ax = self.fig.add_subplot(111)
+    def _setup_axes(self):
+        """ตกแต่งแกน + สร้าง artist ถาวรครั้งเดียว — _draw_chart แค่ป้อนข้อมูลใหม่"""
+        ax = self.ax
         ax.set_facecolor(COL_SURFACE)
         ax.tick_params(colors=COL_TEXT)
         ax.grid(True, linestyle='--', alpha=0.3, color=GRID_COLOR)
         ax.set_ylabel("µg/m³", color=COL_TEXT)
         ax.set_xlabel("Time", color=COL_TEXT)
+        self.line_in, = ax.plot([], [], linewidth=2, label="Indoor")
+        self.line_out, = ax.plot([], [], linewidth=2, label="Outdoor")
+        self._th_line = ax.axhline(0.0, linestyle=':', color=COL_ACCENT, linewidth=1)
+        self._fills = []
+        # legend เป็นงาน Agg ที่แพง (วัด font ทุก label) — สร้างครั้งเดียวพอ
+        leg = ax.legend(loc='upper left', bbox_to_anchor=(0.01, 0.99),
+                        facecolor=COL_SURFACE, edgecolor=COL_TEXT, fontsize=10)
+        for text in leg.get_texts(): text.set_color(COL_TEXT)
+        # แกน X ตรึงไว้: ป้ายเป็นเวลาสัมพัทธ์ ตั้งครั้งเดียว — พื้นหลัง (แกน/กริด/
+        # legend/ป้าย) จะนิ่ง เปิดทางให้ blit เฉพาะเส้นข้อมูลได้
+        ax.set_xlim(0, HISTORY_MAX - 1)
+        step_s = UI_UPDATE_MS / 1000.0
+        tick_idxs = list(range(0, HISTORY_MAX, max(1, HISTORY_MAX // 6)))
+        ax.set_xticks(tick_idxs)
+        ax.set_xticklabels([f"-{(HISTORY_MAX - 1 - t) * step_s:.0f}s" for t in tick_idxs],
+                           rotation=0, ha='center', color=COL_TEXT)
+        # artist ที่ขยับทุกรอบ mark เป็น animated — draw() ปกติจะข้าม
+        # แล้วเราประทับเองหลัง restore_region
+        for artist in (self.line_in, self.line_out, self._th_line):
+            artist.set_animated(True)
+        self._bg = None   # พื้นหลังที่ cache ไว้สำหรับ blit (ใช้ไม่ได้เมื่อ resize)
+
+    def _draw_chart(self):
+        ax = self.ax
+        n = self._hist_n
+        x0 = HISTORY_MAX - n   # ชิดขวา: จุดล่าสุดอยู่ที่ขอบขวาเสมอ (ตรงป้าย 0s)
+        x = self._hist_x[x0:]
+        y_in = self._hist_window(self._hist_in, self._plot_in)
+        y_out = self._hist_window(self._hist_out, self._plot_out)
 
-        x = list(range(len(self.time_history)))
-        y_in = self.indoor_history[:]
-        y_out = self.outdoor_history[:]
+        self.line_in.set_data(x, y_in)
+        self.line_out.set_data(x, y_out)
 
-        ax.plot(x, y_in, linewidth=2, label="Indoor")
-        ax.plot(x, y_out, linewidth=2, label="Outdoor")
+        th = self._th
+        self._th_line.set_ydata([th, th])
+
+        # fill_between สร้าง PolyCollection ใหม่ทุกครั้ง — ลบชุดเก่าก่อนเติมชุดใหม่
+        for coll in self._fills:
+            coll.remove()
+        self._fills.clear()
 
-        th = float(self.auto_on_threshold.get())
         def fill_exceed(series, color_hex):
             muted = mix_color(color_hex, COL_SURFACE, t=0.28)
-            above = [ (v is not None) and (v >= th) for v in series ]
+            above = (series >= th).tolist()
             start = None
             for i, flag in enumerate(above + [False]):
                 if flag and start is None:
                     start = i
                 elif not flag and start is not None:
                     end = i - 1
-                    xs = list(range(start, end+1))
+                    xs = list(range(x0 + start, x0 + end + 1))
                     ys = series[start:end+1]
-                    ax.fill_between(xs, ys, [th]*len(xs), alpha=0.26, color=muted, step=None)
+                    coll = ax.fill_between(xs, ys, [th]*len(xs), alpha=0.26, color=muted, step=None)
+                    coll.set_animated(True)
+                    self._fills.append(coll)
                     start = None
         fill_exceed(y_in, COL_BAD)
         fill_exceed(y_out, COL_WARN)
 
-        ax.axhline(th, linestyle=':', color=COL_ACCENT, linewidth=1)
-
-        vals = [v for v in (y_in + y_out + [th]) if v is not None]
-        if not vals: vals = [0.0, 1.0]
-        ymin = max(0.0, min(vals) - 5.0)
-        ymax = max(vals) * 1.15 + 5.0
+        if n:
+            ymin = max(0.0, min(float(y_in.min()), float(y_out.min()), th) - 5.0)
+            ymax = max(float(y_in.max()), float(y_out.max()), th) * 1.15 + 5.0
+        else:
+            ymin, ymax = 0.0, 1.0
         if ymax <= ymin: ymax = ymin + 10.0
         prev_min, prev_max = getattr(self, "_ylim", (ymin, ymax))
         alpha = 0.25
         new_min = prev_min*(1-alpha) + ymin*alpha
         new_max = prev_max*(1-alpha) + ymax*alpha
         self._ylim = (new_min, new_max)
-        ax.set_ylim(new_min, new_max)
-
-        n = len(x)
-        if n > 0:
-            ticks = min(8, n)
-            idxs = [round(i*(n-1)/(ticks-1)) for i in range(ticks)] if ticks > 1 else [0]
-            ax.set_xticks(idxs)
-            ax.set_xticklabels([self.time_history[i] for i in idxs], rotation=0, ha='center', color=COL_TEXT)
 
-        leg = ax.legend(loc='upper left', bbox_to_anchor=(0.01, 0.99),
-                        facecolor=COL_SURFACE, edgecolor=COL_TEXT, fontsize=10)
-        for text in leg.get_texts(): text.set_color(COL_TEXT)
-
-        self.ax = ax
-        self.canvas.draw_idle()
+        # ขยับ ylim จริงเฉพาะตอนค่า smooth หนีเกิน ~3% ของช่วงเดิม —
+        # พื้นหลังจะได้นิ่งนาน ๆ แล้วรอบส่วนใหญ่เหลือแค่ blit
+        cur_min, cur_max = ax.get_ylim()
+        span = max(cur_max - cur_min, 1e-6)
+        full_redraw = self._bg is None
+        if abs(new_min - cur_min) > 0.03 * span or abs(new_max - cur_max) > 0.03 * span:
+            ax.set_ylim(new_min, new_max)
+            full_redraw = True
+
+        if full_redraw:
+            # วาดพื้นหลังเต็ม (แกน/กริด/legend/ป้าย) แล้วเก็บ snapshot ไว้ restore
+            self.canvas.draw()
+            self._bg = self.canvas.copy_from_bbox(self.fig.bbox)
+        else:
+            self.canvas.restore_region(self._bg)
+        # ประทับ artist เคลื่อนไหวทับพื้นหลัง แล้ว blit ขึ้นจอ — ไม่ composite ทั้งรูป
+        for coll in self._fills:
+            ax.draw_artist(coll)
+        ax.draw_artist(self.line_in)
+        ax.draw_artist(self.line_out)
+        ax.draw_artist(self._th_line)
+        self.canvas.blit(self.fig.bbox)
+
+    def _set_auto_state(self, txt):
+        """เขียนป้ายสถานะ auto ไม่เกิน 1 ครั้ง/วินาที และข้ามข้อความซ้ำเดิม"""
+        now = time.monotonic()
+        if txt == self._auto_last_txt or now - self._auto_last_t < 1.0:
+            return
+        self._auto_last_txt = txt
+        self._auto_last_t = now
+        self.auto_state_lbl.config(text=txt)
 
     def _auto_control(self, indoor, outdoor):
-        if not self.auto_enabled.get():
-            self.auto_state_lbl.config(text="Auto state: idle"); return
-        source = self.auto_source.get()
+        if not self._auto_enabled:
+            self._set_auto_state("Auto state: idle"); return
+        source = self._auto_src
         pm = indoor['pm25'] if source == 'Indoor' else outdoor['pm25']
-        on_th = float(self.auto_on_threshold.get()); hyster = float(self.auto_hysteresis.get())
+        on_th = self._th; hyster = self._hy
         off_th = max(0.0, on_th - hyster)
-        currently_on = any(self.relays.states.values())
+        currently_on = self.relays.any_on
         desired_on = (pm >= on_th) if not currently_on else (pm >= off_th)
-        self.relays.set_all(desired_on)
-        for pin in RELAY_PINS: self._refresh_relay_text(pin)
-        self.auto_state_lbl.config(text=f"Auto state: {'ON' if desired_on else 'OFF'} | {source} PM2.5={pm:.1f} ≥ {on_th:.1f} / < {off_th:.1f}")
+        if desired_on != currently_on:
+            # สั่ง GPIO/รีเฟรชปุ่มเฉพาะตอนสถานะเปลี่ยนจริง
+            self.relays.set_all(desired_on)
+            for pin in RELAY_PINS: self._refresh_relay_text(pin)
+        self._set_auto_state(f"Auto state: {'ON' if desired_on else 'OFF'} | {source} PM2.5={pm:.1f} ≥ {on_th:.1f} / < {off_th:.1f}")
 
     def _sync_sizes(self, event=None):
         try:
@@ -622,11 +661,13 @@ class PMDashboard:
     def _on_right_resize(self, event=None):
         try:
             self.canvas_widget.configure(width=self.right_side.winfo_width(), height=self.right_side.winfo_height())
+            self._bg = None  # ขนาดรูปเปลี่ยน — พื้นหลังที่ cache ไว้ใช้ต่อไม่ได้
         except Exception:
             pass
 
     def on_close(self):
         self._running = False
+        self._stop_readers.set()
         if getattr(self, "job", None) is not None:
             try: self.root.after_cancel(self.job)
             except Exception: pass
@@ -0,0 +1,375 @@
+# -*- coding: utf-8 -*-
+"""
+ของกลางที่ dashboard.py กับ test/dashboard.py ใช้ร่วมกัน
+แยกออกมาเพื่อไม่ให้ class/ตาราง duplicate สองไฟล์ (bytecode ชุดเดียว แก้ที่เดียว)
+- PMSReader: อ่าน PMSx003/3005 non-blocking, resync + ตรวจ checksum
+- RelayController: backend lgpio group -> gpiozero -> RPi.GPIO -> mock
+- PM25_BANDS / pm25_category: ตาราง band + lookup แบบ bisect + memoize
+"""
+import bisect
+import os
+import select
+import struct
+import time
+from functools import lru_cache
+
+# ---------- GPIO backends (lazy) ----------
+# import พวกนี้กินเวลา cold start บน Pi — เลื่อนไปทำตอนสร้าง RelayController
+# ครั้งแรกแทน แล้ว memoize ผลไว้ที่ module-level
+_gpio_loaded = False
+_lgpio = None
+_lgpio_available = False
+_GpioZeroDevice = None
+Device = None
+_gpiozero_available = False
+_gpiozero_backend_name = 'auto'
+GPIO = None
+_rpi_gpio_available = False
+
+
+def _load_gpio_backends():
+    global _gpio_loaded, _lgpio, _lgpio_available
+    global _GpioZeroDevice, Device, _gpiozero_available, _gpiozero_backend_name
+    global GPIO, _rpi_gpio_available
+    if _gpio_loaded:
+        return
+    _gpio_loaded = True
+    try:
+        import lgpio as _lgpio_mod
+        _lgpio = _lgpio_mod
+        _lgpio_available = True
+    except Exception as e:
+        print(f"[WARN] lgpio not available: {e}")
+    try:
+        from gpiozero import DigitalOutputDevice, Device as _Device
+        _GpioZeroDevice = DigitalOutputDevice
+        Device = _Device
+        try:
+            from gpiozero.pins.lgpio import LGPIOFactory
+            Device.pin_factory = LGPIOFactory()
+            _gpiozero_backend_name = 'lgpio'
+        except Exception:
+            _gpiozero_backend_name = 'auto'
+        _gpiozero_available = True
+    except Exception as e:
+        print(f"[WARN] gpiozero not available: {e}")
+    try:
+        import RPi.GPIO as _GPIO
+        _GPIO.setwarnings(False)
+        GPIO = _GPIO
+        _rpi_gpio_available = True
+    except Exception as e:
+        print(f"[WARN] RPi.GPIO not available: {e}")
+
+# ---------- PM2.5 bands ----------
+PM25_BANDS = [
+    (0.0, 12.0, "Good", "#2ecc71"),
+    (12.1, 35.4, "Moderate", "#f1c40f"),
+    (35.5, 55.4, "USG", "#e67e22"),
+    (55.5, 150.4, "Unhealthy", "#e74c3c"),
+    (150.5, 250.4, "Very Unhealthy", "#8e44ad"),
+    (250.5, float("inf"), "Hazardous", "#7f0000"),
+]
+
+# ตารางช่วยค้นแบบ binary search (ขอบบนเรียงอยู่แล้วใน PM25_BANDS)
+_PM25_UPPERS = [hi for _, hi, _, _ in PM25_BANDS]
+_PM25_META = [(label, color) for _, _, label, color in PM25_BANDS]
+PM25_FALLBACK = ("-", "#7f8c8d")
+
+
+@lru_cache(maxsize=256)
+def _pm25_category_cached(value: float):
+    i = bisect.bisect_left(_PM25_UPPERS, value)
+    if i < len(_PM25_META):
+        return _PM25_META[i]
+    return PM25_FALLBACK
+
+
+def pm25_category(value: float):
+    if value is None or value < 0 or value != value:  # None / ติดลบ / NaN — ไม่เข้า cache
+        return PM25_FALLBACK
+    return _pm25_category_cached(value)
+
+
+# ---------- PMS reader ----------
+# ATM PM1.0/PM2.5/PM10 (bytes 10..15) — precompile ไว้ครั้งเดียว
+_PMS_ATM = struct.Struct(">HHH")
+
+
+def _tune_usb_serial_latency(port: str):
+    """ลด latency_timer ของ USB-serial adapter (FTDI default = 16ms) เหลือ 1ms
+    มีผลเฉพาะ /dev/ttyUSB*; อาจต้อง root/udev rule ถึงเขียน sysfs ได้"""
+    name = os.path.basename(port)
+    if not name.startswith("ttyUSB"):
+        return
+    try:
+        with open(f"/sys/bus/usb-serial/devices/{name}/latency_timer", "w") as f:
+            f.write("1")
+        print(f"[SERIAL] latency_timer=1ms on {name}")
+    except OSError as e:
+        print(f"[WARN] cannot set latency_timer on {name}: {e}")
+
+
+class PMSReader:
+    """อ่าน PMSx003/3005 แบบ non-blocking (timeout=0) แล้ว parse ในบัฟเฟอร์เอง
+    ใช้ค่า Atmospheric (ATM): bytes 10..15 และตรวจ checksum ก่อนเชื่อเฟรม"""
+
+    def __init__(self, port: str, baudrate=9600, timeout=0):
+        try:
+            # lazy: pyserial ลาก submodule มาเยอะ ไม่ต้องจ่ายตอน import module
+            import serial
+            self.ser = serial.Serial(port, baudrate=baudrate, timeout=timeout)
+            try: self.ser.reset_input_buffer()
+            except Exception: pass
+            # ถ้าเปิดพอร์ตแบบ blocking เมื่อไหร่ ให้ read คืนทันทีที่เฟรมจบ
+            try: self.ser.inter_byte_timeout = 0.01
+            except Exception: pass
+            # ขยายบัฟเฟอร์รับฝั่ง OS (รองรับเฉพาะบาง platform/driver)
+            try: self.ser.set_buffer_size(rx_size=8192)
+            except Exception: pass
+            _tune_usb_serial_latency(port)
+            self.buf = bytearray()
+            self.last = {"pm1": 0.0, "pm25": 0.0, "pm10": 0.0}
+            self.last_ts = 0.0
+            self.ok = True
+        except Exception as e:
+            print(f"[WARN] Cannot open serial {port}: {e}")
+            self.ser = None
+            self.ok = False
+
+    def _parse_frames(self):
+        # เดินด้วย cursor บน memoryview — ไม่ slice bytearray เป็นก้อนใหม่ต่อเฟรม
+        # แล้วค่อยตัดส่วนที่กินแล้วทิ้งครั้งเดียวตอนจบ
+        buf = self.buf
+        n = len(buf)
+        mv = memoryview(buf)
+        cursor = 0
+        while True:
+            j = buf.find(b'\x42\x4D', cursor)
+            if j < 0:
+                # เก็บท้ายไว้ 1 ไบต์เผื่อหัวเฟรมขาด
+                cursor = max(cursor, n - 1)
+                break
+            if n - j < 32:
+                # รอข้อมูลเพิ่ม
+                cursor = j
+                break
+            # ตรวจ checksum (ผลรวม bytes 0..29 เทียบ bytes 30..31)
+            # ไม่ตรง = header ปลอม/เฟรมพัง — ข้าม header นี้แล้วหาใหม่
+            if (sum(mv[j:j+30]) & 0xFFFF) != ((buf[j+30] << 8) | buf[j+31]):
+                cursor = j + 2
+                continue
+            pm1, pm25, pm10 = _PMS_ATM.unpack_from(mv, j + 10)
+            self.last = {"pm1": float(pm1), "pm25": float(pm25), "pm10": float(pm10)}
+            self.last_ts = time.time()
+            cursor = j + 32
+        mv.release()  # ต้องปล่อยก่อน ไม่งั้น del ด้านล่างโดน BufferError
+        if cursor > 0:
+            del buf[:cursor]
+
+    def poll(self):
+        if not self.ok:
+            return self.last
+        try:
+            # ขอก้อนใหญ่ทีเดียว: timeout=0 คืนเท่าที่ค้างอยู่ทันที — เหลือ read
+            # syscall เดียวต่อรอบ ไม่ต้อง ioctl ถาม in_waiting ก่อน
+            data = self.ser.read(4096)
+            if data:
+                self.buf += data
+                self._parse_frames()
+        except Exception as e:
+            print(f"[WARN] Serial read error: {e}")
+        return self.last
+
+    def read_once(self):
+        return self.poll()
+
+    def wait(self, timeout=0.5):
+        """บล็อกบน select จน fd มีข้อมูล (หรือครบ timeout) — thread ผู้อ่าน
+        ตื่นตามจังหวะข้อมูลจริงแทน sleep-poll คืน True เมื่อมีของให้อ่าน"""
+        if not self.ok:
+            time.sleep(timeout)
+            return False
+        try:
+            r, _, _ = select.select([self.ser.fileno()], [], [], timeout)
+            return bool(r)
+        except Exception:
+            time.sleep(timeout)
+            return False
+
+    def close(self):
+        try:
+            if self.ser: self.ser.close()
+        except Exception:
+            pass
+
+
+# ---------- Relay controller ----------
+class RelayController:
+    def __init__(self, pins, active_low=True):
+        _load_gpio_backends()
+        self.pins = list(pins)
+        self.active_low = bool(active_low)
+        self.states = {p: False for p in pins}
+        self._on_count = 0      # นับขาที่ ON ไว้ จะได้ไม่ต้อง any(states) ทุก tick
+        self.any_on = False
+        self._last_all = None   # สถานะจาก set_all ล่าสุด (None = มีขาถูกสั่งเดี่ยว)
+        self.backend = None
+        self._devices = {}
+        self._dev_list = []
+        self._chip = None
+        self._pin_mask = (1 << len(self.pins)) - 1
+        # lgpio ตรง ๆ ก่อน: claim เป็น group เดียว จะได้สั่ง All ON/OFF ใน syscall เดียว
+        if _lgpio_available:
+            try:
+                self._chip = _lgpio.gpiochip_open(0)
+                off_level = 1 if self.active_low else 0
+                _lgpio.group_claim_output(self._chip, self.pins, [off_level] * len(self.pins))
+                self.backend = 'lgpio'
+                print('[GPIO] Using lgpio group backend')
+            except Exception as e:
+                print(f"[WARN] lgpio group init failed: {e}")
+                try:
+                    if self._chip is not None:
+                        _lgpio.gpiochip_close(self._chip)
+                except Exception:
+                    pass
+                self._chip = None
+                self.backend = None
+        if self.backend is None and _gpiozero_available:
+            try:
+                for p in pins:
+                    dev = _GpioZeroDevice(p, active_high=(not self.active_low), initial_value=False)
+                    self._devices[p] = dev
+                self._dev_list = list(self._devices.values())  # ไว้วนตรง ๆ ตอน set_all
+                self.backend = 'gpiozero'
+                print(f"[GPIO] Using gpiozero backend ({_gpiozero_backend_name})")
+            except Exception as e:
+                print(f"[WARN] gpiozero init failed: {e}")
+                self.backend = None
+        if self.backend is None and _rpi_gpio_available:
+            try:
+                GPIO.setmode(GPIO.BCM)
+                for p in pins:
+                    GPIO.setup(p, GPIO.OUT)
+                for p in pins:
+                    self._apply_pin_rpigpio(p, False)
+                self.backend = 'RPi.GPIO'
+                print('[GPIO] Using RPi.GPIO backend')
+            except Exception as e:
+                print(f"[WARN] RPi.GPIO init failed: {e}")
+                self.backend = None
+        if self.backend is None:
+            self.backend = 'mock'
+            print('[GPIO] Using MOCK backend (no hardware)')
+
+    def _record_state(self, pin, state):
+        if self.states.get(pin) != state:
+            self._on_count += 1 if state else -1
+            self.any_on = self._on_count > 0
+        self.states[pin] = state
+
+    def _level_bits(self, state):
+        """แปลงสถานะ logical เป็น bits ของทั้ง group ตาม polarity"""
+        if self.active_low:
+            return 0 if state else self._pin_mask
+        return self._pin_mask if state else 0
+
+    def _apply_pin_lgpio(self, pin, state):
+        i = self.pins.index(pin)
+        level = (0 if state else 1) if self.active_low else (1 if state else 0)
+        _lgpio.group_write(self._chip, self.pins[0], level << i, 1 << i)
+        self._record_state(pin, state)
+
+    def _apply_pin_gpiozero(self, pin, state):
+        dev = self._devices.get(pin)
+        if dev:
+            dev.on() if state else dev.off()
+        self._record_state(pin, state)
+
+    def _apply_pin_rpigpio(self, pin, state):
+        if self.active_low:
+            level = GPIO.LOW if state else GPIO.HIGH
+        else:
+            level = GPIO.HIGH if state else GPIO.LOW
+        GPIO.output(pin, level)
+        self._record_state(pin, state)
+
+    def _apply_pin(self, pin, state):
+        if self.backend == 'lgpio':
+            self._apply_pin_lgpio(pin, state)
+        elif self.backend == 'gpiozero':
+            self._apply_pin_gpiozero(pin, state)
+        elif self.backend == 'RPi.GPIO':
+            self._apply_pin_rpigpio(pin, state)
+        else:
+            print(f"[MOCK GPIO] Pin {pin} -> {'ON' if state else 'OFF'}")
+            self._record_state(pin, state)
+
+    def set(self, pin, state: bool):
+        if pin in self.pins:
+            self._apply_pin(pin, bool(state))
+            self._last_all = None  # สั่งรายขาแล้ว — กลุ่มไม่ uniform อีกต่อไป
+
+    def toggle(self, pin):
+        self.set(pin, not self.states.get(pin, False))
+
+    def set_all(self, state: bool):
+        state = bool(state)
+        if state == self._last_all:
+            return  # ทุกขาอยู่สถานะนี้แล้ว (auto control เรียกซ้ำทุก tick)
+        self._last_all = state
+        if self.backend == 'lgpio':
+            # เขียนทั้ง group ครั้งเดียว แทน ioctl ต่อขา
+            _lgpio.group_write(self._chip, self.pins[0], self._level_bits(state), self._pin_mask)
+        elif self.backend == 'gpiozero':
+            # เรียก device ตรง ๆ ข้าม dispatch ของ _apply_pin ต่อขา
+            if state:
+                for d in self._dev_list: d.on()
+            else:
+                for d in self._dev_list: d.off()
+        elif self.backend == 'RPi.GPIO':
+            # สั่งทีเดียวทั้งลิสต์ (RPi.GPIO รับ list ของ channel ได้)
+            level = (GPIO.LOW if state else GPIO.HIGH) if self.active_low \
+                else (GPIO.HIGH if state else GPIO.LOW)
+            GPIO.output(self.pins, level)
+        else:
+            # mock: print บรรทัดเดียวพอ ไม่ต้องบรรทัดละขา
+            print(f"[MOCK GPIO] All pins -> {'ON' if state else 'OFF'}")
+        for p in self.pins:
+            self._record_state(p, state)
+
+    def cleanup(self):
+        try:
+            if self.backend == 'lgpio':
+                try:
+                    _lgpio.group_write(self._chip, self.pins[0], self._level_bits(False), self._pin_mask)
+                except Exception: pass
+                try:
+                    _lgpio.group_free(self._chip, self.pins[0])
+                except Exception: pass
+                try:
+                    _lgpio.gpiochip_close(self._chip)
+                except Exception: pass
+            elif self.backend == 'gpiozero':
+                for dev in self._devices.values():
+                    try: dev.off()
+                    except: pass
+                    try: dev.close()
+                    except: pass
+                # สำคัญ: ปิดโรงงานขา ป้องกัน "GPIO busy" บน Pi 5
+                try:
+                    if Device and getattr(Device, "pin_factory", None):
+                        Device.pin_factory.close()
+                except Exception as e:
+                    print(f"[WARN] pin_factory.close() failed: {e}")
+            elif self.backend == 'RPi.GPIO':
+                try:
+                    for p in self.pins:
+                        self._apply_pin_rpigpio(p, False)
+                except Exception: pass
+                try:
+                    GPIO.cleanup()
+                except Exception: pass
+        except Exception:
+            pass
@@ -1,20 +1,37 @@
 # drive_hook.py (optimized incremental sync)
-import os, json, time, hashlib
+import os, io, gzip, json, mmap, time, shutil, sqlite3, hashlib, threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime, timedelta
 
 # ---------- Google Drive deps ----------
-_gdrive_ok = False
-try:
-    from googleapiclient.discovery import build
-    from googleapiclient.http import MediaFileUpload
-    from google.oauth2 import service_account as gsa
-    from google.oauth2.credentials import Credentials as UserCreds
-    from google.auth.transport.requests import Request
-    _gdrive_ok = True
-except Exception as e:
-    print(f"[GDRIVE] google libs not available: {e}")
-    _gdrive_ok = False
+# import จริงเลื่อนไปตอนเปิดใช้งาน (_load_google_libs) — googleapiclient ลากมา
+# หลายสิบโมดูล (~200ms) ไม่ควรจ่ายตอน GDRIVE_ENABLED=false ซึ่งเป็นเคสปกติ
+import importlib.util
+_gdrive_ok = importlib.util.find_spec("googleapiclient") is not None
+if not _gdrive_ok:
+    print("[GDRIVE] google libs not available")
+
+build = None
+MediaFileUpload = None
+MediaIoBaseUpload = None
+Request = None
+gsa = None
+UserCreds = None
+
+def _load_google_libs():
+    """โหลด google libs ครั้งแรกที่ uploader เปิดใช้งานจริง"""
+    global build, MediaFileUpload, MediaIoBaseUpload, Request, gsa, UserCreds
+    if build is not None:
+        return
+    from googleapiclient.discovery import build as _build
+    from googleapiclient.http import (MediaFileUpload as _MediaFileUpload,
+                                      MediaIoBaseUpload as _MediaIoBaseUpload)
+    from google.oauth2 import service_account as _gsa
+    from google.oauth2.credentials import Credentials as _UserCreds
+    from google.auth.transport.requests import Request as _Request
+    build, MediaFileUpload, MediaIoBaseUpload = _build, _MediaFileUpload, _MediaIoBaseUpload
+    gsa, UserCreds, Request = _gsa, _UserCreds, _Request
 
 # ---------- Helpers ----------
 def _env_bool(name, default=False):
@@ -33,12 +50,16 @@ def _int(name, default):
     except Exception:
         return default
 
-def _file_md5(path, chunk=1<<20):
-    h = hashlib.md5()
+def _file_digest(path, chunk=1<<20):
+    # sha256 ผ่าน hashlib.file_digest (3.11+): loop อ่าน/อัปเดตอยู่ฝั่ง C ทั้งหมด
+    # และ OpenSSL เลือก SHA-NI/NEON ให้เอง — เร็วกว่า md5 ทีละ chunk ฝั่ง Python มาก
     with open(path, 'rb') as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        h = hashlib.sha256()
         for b in iter(lambda: f.read(chunk), b''):
             h.update(b)
-    return h.hexdigest()
+        return h.hexdigest()
 
 # ---------- Uploader ----------
 class DriveUploader:
@@ -66,16 +87,33 @@ class DriveUploader:
         self.service = None
         self._known_ids = {}   # fname -> fileId
         self._queue = []       # list[str] of file paths
-        self._manifest = {}    # path -> {size, mtime, md5?, file_id?, updated?}
+        self._db = None        # sqlite manifest: path -> size/mtime/sha256/file_id/gz/updated
+        self._digest_cache = {}  # path -> (size, mtime, hexdigest)
+        # dirty flag: สะสมการแก้ไว้ในหน่วยความจำ แล้ว flush เป็นก้อนตอนจบรอบ
+        self._manifest_dirty = False
+        self._queue_dirty = False
+        # อัปโหลดขนานกัน 4 ไฟล์ — เวลารวมถูกจำกัดด้วย RTT ไม่ใช่ bandwidth
+        self.max_workers = 4
+        self._state_lock = threading.Lock()   # กัน manifest/_known_ids ชนกันข้าม thread
+        self._creds = None
+        self._tls = threading.local()         # service ของ googleapiclient ไม่ thread-safe
+        # cache ชื่อ→fileId ข้ามรัน เก็บข้าง ๆ manifest
+        # (ตั้งก่อน early-return ด้านล่าง — flush_state โดนเรียกตอน finalize
+        # แม้ uploader จะ disabled)
+        self.known_ids_path = (str(Path(self.manifest_path).with_name("known_ids.json"))
+                               if self.manifest_path else "")
+        self._known_ids_dirty = False
 
         if not self.enabled:
             print("[GDRIVE] disabled")
             return
+
         try:
             self._init_service()
             self._ensure_folder()
             self._load_queue()
             self._load_manifest()
+            self._warm_known_ids()
             if self.debug:
                 print(f"[GDRIVE] Ready → folder_id={self.folder_id}, auth={self.auth}, "
                       f"recent_days={self.recent_days}, max_files={self.max_files}, "
@@ -86,54 +124,131 @@ class DriveUploader:
 
     # ----- manifest -----
     def _load_manifest(self):
-        self._manifest = {}
+        # sqlite WAL แทน JSON ก้อนเดียว: lookup O(1), เขียนเฉพาะแถวที่เปลี่ยน
+        # (JSON ต้อง serialize ทั้ง dict ทุกครั้ง — แพงขึ้นเรื่อย ๆ ตามจำนวนไฟล์)
+        self._db = None
         if not self.manifest_path:
             return
         try:
             p = Path(self.manifest_path)
-            if p.exists():
-                self._manifest = json.loads(p.read_text(encoding='utf-8')) or {}
+            p.parent.mkdir(parents=True, exist_ok=True)
+            db_path = p.with_suffix(".db")
+            # upload worker หลาย thread ใช้ connection เดียวใต้ _state_lock
+            self._db = sqlite3.connect(str(db_path), check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS manifest("
+                "path TEXT PRIMARY KEY, size INT, mtime INT, sha256 TEXT, "
+                "file_id TEXT, gz INT, updated INT, "
+                "uploaded_size INT, deltas INT)")
+            # db จากรุ่นก่อนหน้ายังไม่มีคอลัมน์ delta — เติมให้เงียบ ๆ
+            for col in ("uploaded_size INT", "deltas INT"):
+                try:
+                    self._db.execute(f"ALTER TABLE manifest ADD COLUMN {col}")
+                except sqlite3.OperationalError:
+                    pass
+            self._migrate_json_manifest()
+            self._db.commit()
             if self.debug:
-                print(f"[GDRIVE] manifest loaded: {len(self._manifest)} item(s) from {p}")
+                n = self._db.execute("SELECT COUNT(*) FROM manifest").fetchone()[0]
+                print(f"[GDRIVE] manifest db ready: {n} item(s) at {db_path}")
         except Exception as e:
-            print(f"[GDRIVE] manifest read failed: {e}")
-            self._manifest = {}
+            print(f"[GDRIVE] manifest db open failed: {e}")
+            self._db = None
 
-    def _save_manifest(self):
-        if not self.manifest_path:
+    def _migrate_json_manifest(self):
+        """ย้าย manifest JSON รุ่นเก่าเข้า sqlite ครั้งเดียว แล้วเก็บไฟล์เดิมเป็น .bak"""
+        p = Path(self.manifest_path)
+        if not p.exists():
             return
         try:
-            p = Path(self.manifest_path)
-            p.parent.mkdir(parents=True, exist_ok=True)
-            p.write_text(json.dumps(self._manifest, ensure_ascii=False, indent=2), encoding='utf-8')
+            old = json.loads(p.read_text(encoding='utf-8')) or {}
+            for path, rec in old.items():
+                self._db.execute(
+                    "INSERT OR IGNORE INTO manifest(path,size,mtime,sha256,file_id,gz,updated) "
+                    "VALUES(?,?,?,?,?,?,?)",
+                    (path, rec.get("size"), rec.get("mtime"), rec.get("sha256"),
+                     rec.get("file_id"), 1 if rec.get("gz") else 0, rec.get("updated")))
+            os.replace(p, p.with_suffix(p.suffix + ".bak"))
             if self.debug:
-                print(f"[GDRIVE] manifest saved: {len(self._manifest)} item(s) → {p}")
+                print(f"[GDRIVE] migrated {len(old)} manifest item(s) from JSON")
+        except Exception as e:
+            print(f"[GDRIVE] manifest migrate failed: {e}")
+
+    def _manifest_get(self, path):
+        if self._db is None:
+            return None
+        with self._state_lock:
+            row = self._db.execute(
+                "SELECT size, mtime, sha256, file_id, gz, updated, uploaded_size, deltas "
+                "FROM manifest WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return None
+        rec = {"size": row[0], "mtime": row[1], "file_id": row[3],
+               "gz": bool(row[4]), "updated": row[5],
+               "uploaded_size": row[6] or 0, "deltas": bool(row[7])}
+        if row[2]:
+            rec["sha256"] = row[2]
+        return rec
+
+    def _manifest_put(self, path, sig):
+        if self._db is None:
+            return
+        with self._state_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO manifest"
+                "(path,size,mtime,sha256,file_id,gz,updated,uploaded_size,deltas) "
+                "VALUES(?,?,?,?,?,?,?,?,?)",
+                (path, sig.get("size"), sig.get("mtime"), sig.get("sha256"),
+                 sig.get("file_id"), 1 if sig.get("gz") else 0, sig.get("updated"),
+                 sig.get("uploaded_size") or 0, 1 if sig.get("deltas") else 0))
+            self._manifest_dirty = True
+
+    def _save_manifest(self):
+        self._manifest_dirty = False
+        if self._db is None:
+            return
+        try:
+            with self._state_lock:
+                self._db.commit()
         except Exception as e:
-            print(f"[GDRIVE] manifest write failed: {e}")
+            print(f"[GDRIVE] manifest commit failed: {e}")
 
-    def _sig(self, path):
-        st = os.stat(path)
+    def _sig(self, path, st=None):
+        if st is None:
+            st = os.stat(path)
         sig = {"size": st.st_size, "mtime": int(st.st_mtime)}
         if self.use_md5:
-            sig["md5"] = _file_md5(path)
+            # เก็บไว้อ้างอิงตอนอัปโหลดเท่านั้น (คีย์ sha256 ทำให้ entry md5 เก่าหมดอายุเอง)
+            # memoize ต่อ path: ค่าใหม่ทับค่าเก่าตอนไฟล์โต — cache โตไม่เกิน
+            # หนึ่ง entry ต่อไฟล์ (ไฟล์รายวันโตทุกรอบ คีย์ตาม mtime จะรั่วไม่หยุด)
+            sz, mt = st.st_size, int(st.st_mtime)
+            cached = self._digest_cache.get(path)
+            if cached is not None and cached[0] == sz and cached[1] == mt:
+                digest = cached[2]
+            else:
+                digest = _file_digest(path)
+                self._digest_cache[path] = (sz, mt, digest)
+            sig["sha256"] = digest
         return sig
 
-    def _unchanged(self, path):
+    def _unchanged(self, path, st=None):
         if not self.skip_unchanged:
             return False
         p = os.path.abspath(path)
-        old = self._manifest.get(p)
+        old = self._manifest_get(p)
         if not old:
             return False
-        new = self._sig(p)
-        # Compare size+mtime and md5 (if tracked)
-        same = (old.get("size")==new.get("size") and old.get("mtime")==new.get("mtime"))
-        if self.use_md5:
-            same = same and (old.get("md5")==new.get("md5"))
-        return same
+        # size+mtime ตรงกับ manifest = ไม่เปลี่ยน — ใช้ stat ที่ผู้เรียก stat มาแล้ว
+        # ได้ ไม่ต้อง stat/hash ซ้ำทุกรอบ sync เหมือนก่อน
+        if st is None:
+            st = os.stat(p)
+        return old.get("size") == st.st_size and old.get("mtime") == int(st.st_mtime)
 
     # ----- auth/service -----
     def _init_service(self):
+        _load_google_libs()
         if self.auth == "service_account":
             creds = gsa.Credentials.from_service_account_file(self.sa_key, scopes=self.SCOPES)
         else:
@@ -146,8 +261,17 @@ class DriveUploader:
                     creds.refresh(Request())
                 else:
                     raise RuntimeError("OAuth token missing; create token.json with OAuth flow")
+        self._creds = creds
         self.service = build("drive", "v3", credentials=creds, cache_discovery=False)
 
+    def _service(self):
+        """service แยกต่อ thread (สร้างครั้งแรกแล้วจำใน thread-local)"""
+        svc = getattr(self._tls, "service", None)
+        if svc is None:
+            svc = build("drive", "v3", credentials=self._creds, cache_discovery=False)
+            self._tls.service = svc
+        return svc
+
     def _ensure_folder(self):
         if self.folder_id:
             return
@@ -161,10 +285,52 @@ class DriveUploader:
             created = self.service.files().create(body=meta, fields="id").execute()
             self.folder_id = created["id"]
 
+    def _warm_known_ids(self):
+        """อุ่น cache ชื่อ→fileId: โหลดไฟล์ cache เก่า แล้ว list ทั้งโฟลเดอร์รอบเดียว
+        (หน้าละ 1000) — หลัง restart จะได้ไม่ต้องถาม Drive ทีละไฟล์ก่อนอัปโหลด"""
+        if self.known_ids_path:
+            try:
+                p = Path(self.known_ids_path)
+                if p.exists():
+                    self._known_ids.update(json.loads(p.read_text(encoding='utf-8')) or {})
+            except Exception as e:
+                print(f"[GDRIVE] known_ids read failed: {e}")
+        try:
+            page_token = None
+            while True:
+                res = self.service.files().list(
+                    q=f"'{self.folder_id}' in parents and trashed = false",
+                    spaces="drive", fields="nextPageToken,files(id,name)",
+                    pageSize=1000, pageToken=page_token).execute()
+                for f in res.get("files", []):
+                    self._known_ids[f["name"]] = f["id"]
+                page_token = res.get("nextPageToken")
+                if not page_token:
+                    break
+            self._known_ids_dirty = True
+            if self.debug:
+                print(f"[GDRIVE] known ids warmed: {len(self._known_ids)} item(s)")
+        except Exception as e:
+            print(f"[GDRIVE] warm known ids failed: {e}")
+
+    def _save_known_ids(self):
+        self._known_ids_dirty = False
+        if not self.known_ids_path:
+            return
+        try:
+            p = Path(self.known_ids_path)
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_suffix(p.suffix + ".tmp")
+            tmp.write_text(json.dumps(self._known_ids, ensure_ascii=False, separators=(",", ":")),
+                           encoding='utf-8')
+            os.replace(tmp, p)
+        except Exception as e:
+            print(f"[GDRIVE] known_ids write failed: {e}")
+
     def _find_file_id(self, name, manifest_key=None):
         # Try manifest hint first
         if manifest_key:
-            rec = self._manifest.get(manifest_key) or {}
+            rec = self._manifest_get(manifest_key) or {}
             fid = rec.get("file_id")
             if fid:
                 return fid
@@ -173,16 +339,131 @@ class DriveUploader:
             return self._known_ids[name]
         # Then query Drive
         q = f"name = '{name}' and '{self.folder_id}' in parents and trashed = false"
-        res = self.service.files().list(q=q, spaces="drive", fields="files(id,name)", pageSize=1).execute()
+        res = self._service().files().list(q=q, spaces="drive", fields="files(id,name)", pageSize=1).execute()
         files = res.get("files", [])
         if files:
             fid = files[0]["id"]
             self._known_ids[name] = fid
+            self._known_ids_dirty = True
             return fid
         return None
 
+    def _prefetch_file_ids(self, paths):
+        """ถาม Drive ครั้งเดียวด้วยเงื่อนไข name OR กัน แทน list() ทีละไฟล์
+        (media upload ใช้ batch endpoint ไม่ได้ — เลย amortize ฝั่ง lookup แทน)"""
+        names = []
+        for p in paths:
+            name = os.path.basename(p)
+            rec = self._manifest_get(p) or {}
+            if name not in self._known_ids and not rec.get("file_id"):
+                names.append(name)
+        if not names:
+            return
+        try:
+            cond = " or ".join(f"name = '{n}'" for n in names)
+            q = f"({cond}) and '{self.folder_id}' in parents and trashed = false"
+            res = self._service().files().list(q=q, spaces="drive",
+                                               fields="files(id,name)",
+                                               pageSize=max(len(names), 10)).execute()
+            for f in res.get("files", []):
+                self._known_ids[f["name"]] = f["id"]
+            if res.get("files"):
+                self._known_ids_dirty = True
+            if self.debug:
+                print(f"[GDRIVE] prefetched {len(res.get('files', []))}/{len(names)} file id(s)")
+        except Exception as e:
+            print(f"[GDRIVE] prefetch file ids failed: {e}")
+
+    GZIP_MIN_BYTES = 64 * 1024   # ไฟล์เล็กกว่านี้ overhead บีบไม่คุ้ม
+    DELTA_MAX_BYTES = 1 << 20    # ส่วนงอกใหญ่กว่านี้อัปโหลดเต็มไฟล์คุ้มกว่า
+
+    def _media_for(self, path, mimetype="text/csv"):
+        """media body จาก mmap + resumable upload: เนื้อไฟล์เสิร์ฟจาก page cache
+        และถ้า HTTP ต้อง retry ก็แค่ seek ใน buffer เดิม ไม่เปิด/อ่านไฟล์ซ้ำ
+        คืน (media, mm, fobj) — ผู้เรียกปิด mm/fobj หลัง execute"""
+        try:
+            f = open(path, 'rb')
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # ไฟล์ว่าง/เปิด mmap ไม่ได้ — ตกกลับ path เดิม
+            return MediaFileUpload(path, mimetype=mimetype, resumable=False), None, None
+        # mmap เป็น file-like (read/seek/tell) อยู่แล้ว — ส่งตรงเลย
+        # ห่อ io.BytesIO จะ copy ทั้งไฟล์ขึ้น heap เสียเปล่า
+        media = MediaIoBaseUpload(mm, mimetype=mimetype,
+                                  chunksize=1 << 20, resumable=True)
+        return media, mm, f
+
+    def _maybe_gzip(self, path, fname):
+        """CSV อนุกรมเวลาอัดได้ ~5-10 เท่า — ไฟล์ใหญ่บีบเป็น .gz ข้าง ๆ ก่อนส่ง
+        คืน (path ที่จะอัปโหลด, ชื่อบน Drive, mimetype, path ชั่วคราวที่ต้องลบ)"""
+        try:
+            if os.path.getsize(path) <= self.GZIP_MIN_BYTES:
+                return path, fname, "text/csv", None
+            gz_path = path + ".gz"
+            with open(path, 'rb') as src, gzip.open(gz_path, 'wb', compresslevel=6) as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            return gz_path, fname + ".gz", "application/gzip", gz_path
+        except OSError as e:
+            print(f"[GDRIVE] gzip failed for {fname}: {e}")
+            return path, fname, "text/csv", None
+
+    def _try_delta_upload(self, p, fname, rec):
+        """ไฟล์ log append-only ที่เคยอัปโหลดแล้วและแค่งอกท้าย: ส่งเฉพาะแถวใหม่
+        เป็นไฟล์เล็ก ๆ ชื่อ <fname>.delta-<offset> แทนการส่งทั้งไฟล์ซ้ำ
+        (Drive ไม่มี append ฝั่ง server — จำ byte offset ที่ส่งไปแล้วใน manifest)"""
+        off = int(rec.get("uploaded_size") or 0)
+        if not rec.get("file_id") or off <= 0:
+            return False
+        try:
+            size = os.path.getsize(p)
+            if size <= off or size - off > self.DELTA_MAX_BYTES:
+                return False
+            with open(p, 'rb') as f:
+                f.seek(off)
+                delta = f.read(size - off)
+            # ตัดให้จบบรรทัด กันแถวครึ่ง ๆ ถ้า logger กำลังเขียนอยู่พอดี
+            cut = delta.rfind(b"\n")
+            if cut < 0:
+                return False
+            delta = delta[:cut + 1]
+            name = f"{fname}.delta-{off}"
+            media = MediaIoBaseUpload(io.BytesIO(delta), mimetype="text/csv")
+            meta = {"name": name, "parents": [self.folder_id]}
+            self._service().files().create(body=meta, media_body=media, fields="id").execute()
+            new_end = off + len(delta)
+            rec = dict(rec)
+            rec["deltas"] = True
+            rec["uploaded_size"] = new_end
+            rec["updated"] = int(time.time())
+            if new_end == size:
+                # ครอบคลุมทั้งไฟล์แล้ว — บันทึก stat ให้ _unchanged ข้ามรอบหน้าได้
+                st = os.stat(p)
+                rec["size"] = st.st_size
+                rec["mtime"] = int(st.st_mtime)
+            self._manifest_put(p, rec)
+            if self.debug:
+                print(f"[GDRIVE] delta uploaded: {name} ({len(delta)} bytes)")
+            return True
+        except Exception as e:
+            print(f"[GDRIVE] delta upload failed for {fname}: {e}")
+            return False
+
+    def _delete_deltas(self, fname):
+        """ลบไฟล์ delta เก่าหลังอัปโหลดเต็มไฟล์ (ตัวเต็มมีข้อมูลครบแล้ว)"""
+        try:
+            q = (f"name contains '{fname}.delta-' and "
+                 f"'{self.folder_id}' in parents and trashed = false")
+            res = self._service().files().list(q=q, spaces="drive",
+                                               fields="files(id,name)", pageSize=100).execute()
+            for f in res.get("files", []):
+                self._service().files().delete(fileId=f["id"]).execute()
+            if self.debug and res.get("files"):
+                print(f"[GDRIVE] compacted {len(res['files'])} delta(s) for {fname}")
+        except Exception as e:
+            print(f"[GDRIVE] delete deltas failed for {fname}: {e}")
+
     # ----- upload -----
-    def upload_now(self, path):
+    def upload_now(self, path, save_manifest=True):
         if not self.enabled: return False
         if not path or not os.path.exists(path): return False
         p = os.path.abspath(path)
@@ -191,36 +472,67 @@ class DriveUploader:
             if self.debug: print(f"[GDRIVE] skip unchanged: {fname}")
             return True
 
-        if self.debug: print(f"[GDRIVE] uploading: {fname}")
-        media = MediaFileUpload(p, mimetype="text/csv", resumable=False)
+        rec = self._manifest_get(p) or {}
+        # ไฟล์งอกท้ายอย่างเดียว → ส่งเฉพาะ delta แทนการ re-upload ทั้งไฟล์
+        if self._try_delta_upload(p, fname, rec):
+            if save_manifest:
+                self._save_manifest()
+            return True
 
-        fid = self._find_file_id(fname, manifest_key=p)
-        if fid:
-            res = self.service.files().update(fileId=fid, media_body=media, fields="id").execute()
-            new_id = res.get("id") or fid
-            if self.debug: print(f"[GDRIVE] updated: {fname}")
-        else:
-            meta = {"name": fname, "parents": [self.folder_id]}
-            res = self.service.files().create(body=meta, media_body=media, fields="id").execute()
-            new_id = res["id"]
-            if self.debug: print(f"[GDRIVE] created: {fname}")
+        if self.debug: print(f"[GDRIVE] uploading: {fname}")
+        up_path, up_name, mimetype, gz_tmp = self._maybe_gzip(p, fname)
+        media, mm, fobj = self._media_for(up_path, mimetype=mimetype)
+
+        svc = self._service()
+        # hint จาก manifest ใช้ได้เฉพาะตอนโหมดบีบ/ไม่บีบตรงกับรอบก่อน
+        # (ไฟล์โตข้ามเกณฑ์ = ชื่อบน Drive เปลี่ยนเป็น .gz — ห้าม update id เดิม)
+        hint_ok = bool(rec.get("gz")) == (gz_tmp is not None)
+        fid = self._find_file_id(up_name, manifest_key=p if hint_ok else None)
+        try:
+            if fid:
+                res = svc.files().update(fileId=fid, media_body=media, fields="id").execute()
+                new_id = res.get("id") or fid
+                if self.debug: print(f"[GDRIVE] updated: {up_name}")
+            else:
+                meta = {"name": up_name, "parents": [self.folder_id]}
+                res = svc.files().create(body=meta, media_body=media, fields="id").execute()
+                new_id = res["id"]
+                if self.debug: print(f"[GDRIVE] created: {up_name}")
+        finally:
+            if mm is not None: mm.close()
+            if fobj is not None: fobj.close()
+            if gz_tmp is not None:
+                try: os.remove(gz_tmp)
+                except OSError: pass
 
         # Update manifest
         sig = self._sig(p)
         sig["file_id"] = new_id
+        sig["gz"] = gz_tmp is not None
         sig["updated"] = int(time.time())
-        self._manifest[p] = sig
-        self._save_manifest()
+        # ตัวเต็มครอบคลุมถึง size นี้แล้ว — รอบหน้าเทียบเพื่อส่งเฉพาะส่วนงอก
+        sig["uploaded_size"] = sig["size"]
+        self._manifest_put(p, sig)
+        # อัปโหลดเต็ม = compact: ตัวเต็มมีทุกแถวแล้ว ลบ delta เก่าทิ้ง
+        if rec.get("deltas"):
+            self._delete_deltas(fname)
+        if save_manifest:
+            self._save_manifest()
         return True
 
     # ----- queue -----
     def enqueue(self, path):
         if not path: return
         p = os.path.abspath(path)
-        if os.path.exists(p) and p not in self._queue:
+        if not os.path.exists(p):
+            return
+        # lock เพราะ sync ตอนเปิดโปรแกรมวิ่งบน thread แยกแล้ว อาจชนกับ enqueue
+        with self._state_lock:
+            if p in self._queue:
+                return
             self._queue.append(p)
-            if self.debug: print(f"[GDRIVE] enqueued: {os.path.basename(p)}")
-            self._save_queue()
+            self._queue_dirty = True  # flush ตอน process_queue/finalize
+        if self.debug: print(f"[GDRIVE] enqueued: {os.path.basename(p)}")
 
     def _load_queue(self):
         self._queue = []
@@ -237,64 +549,101 @@ class DriveUploader:
             self._queue = []
 
     def _save_queue(self):
+        self._queue_dirty = False
         if not self.queue_path:
             return
         try:
             q = Path(self.queue_path)
             q.parent.mkdir(parents=True, exist_ok=True)
-            q.write_text(json.dumps(self._queue, ensure_ascii=False, indent=2), encoding='utf-8')
+            tmp = q.with_suffix(q.suffix + ".tmp")
+            tmp.write_text(json.dumps(self._queue, ensure_ascii=False, separators=(",", ":")),
+                           encoding='utf-8')
+            os.replace(tmp, q)
             if self.debug:
                 print(f"[GDRIVE] queue saved: {len(self._queue)} item(s)")
         except Exception as e:
             print(f"[GDRIVE] save queue failed: {e}")
 
+    def flush_state(self):
+        """เขียน manifest/queue ที่ค้างอยู่ลงดิสก์ (เรียกตอนจบรอบ/ก่อนปิดโปรแกรม)"""
+        if self._manifest_dirty:
+            self._save_manifest()
+        if self._queue_dirty:
+            self._save_queue()
+        if self._known_ids_dirty:
+            self._save_known_ids()
+
+    def _upload_one(self, path):
+        try:
+            # เลื่อนการเขียน manifest ไปท้ายรอบ — ไม่ serialize ทั้งก้อนต่อไฟล์
+            return self.upload_now(path, save_manifest=False)
+        except Exception as e:
+            print(f"[GDRIVE] upload failed for {path}: {e}")
+            return False
+
     def process_queue(self, max_items=50):
         if not self.enabled: return
-        if not self._queue:
+        with self._state_lock:
+            # claim batch ออกจากคิวทันที — sync thread กับ finalize เรียกพร้อมกันได้
+            # ถ้าแค่ copy ไว้ ทั้งสองฝั่งจะอัปโหลดไฟล์เดียวกันซ้ำ (ได้ create ซ้อน)
+            batch = self._queue[:max_items]
+            del self._queue[:max_items]
+            if batch:
+                self._queue_dirty = True
+        if not batch:
             if self.debug: print("[GDRIVE] queue empty")
             return
-        processed = 0
-        newq = []
-        for p in list(self._queue):
-            if processed >= max_items:
-                newq.append(p)  # keep remaining in queue
-                continue
-            ok = False
-            try:
-                ok = self.upload_now(p)
-            except Exception as e:
-                print(f"[GDRIVE] upload failed for {p}: {e}")
-                ok = False
-            if not ok:
-                newq.append(p)
-            else:
-                processed += 1
-        self._queue = newq
-        self._save_queue()
+        self._prefetch_file_ids(batch)
+        # อัปโหลดขนานกัน: เวลาต่อไฟล์จม RTT เป็นหลัก — overlap กันได้เกือบฟรี
+        # (service แยกต่อ thread ผ่าน _service; manifest เขียนใต้ lock)
+        done = set()
+        workers = min(self.max_workers, len(batch))
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="gdrive-up") as pool:
+                for p, ok in zip(batch, pool.map(self._upload_one, batch)):
+                    if ok:
+                        done.add(p)
+        else:
+            for p in batch:
+                if self._upload_one(p):
+                    done.add(p)
+        processed = len(done)
+        failed = [p for p in batch if p not in done]
+        if failed:
+            # คืนตัวที่พลาดกลับเข้าคิวไว้ลองรอบหน้า
+            with self._state_lock:
+                for p in failed:
+                    if p not in self._queue:
+                        self._queue.append(p)
+                self._queue_dirty = True
+        self.flush_state()
         if self.debug: print(f"[GDRIVE] queue after process: {len(self._queue)} item(s), processed={processed}")
 
     # ----- discovery/sync -----
     def sync_local_csvs(self, csv_dir):
         try:
-            pdir = Path(csv_dir)
-            all_files = sorted(pdir.glob("*.csv"), key=lambda p: p.stat().st_mtime, reverse=True)
-            total = len(all_files)
+            # scandir อ่าน directory รอบเดียวได้ DirEntry ที่พก stat มาด้วย
+            # (.glob + .stat() = syscall ต่อไฟล์; อันนี้เหลือ ~N เดียวบน SD card)
+            with os.scandir(csv_dir) as it:
+                entries = [(Path(e.path), e.stat())
+                           for e in it if e.is_file() and e.name.endswith(".csv")]
+            entries.sort(key=lambda e: e[1].st_mtime, reverse=True)
+            total = len(entries)
 
             # filter by recency
-            recent_cut = None
             if self.recent_days and self.recent_days > 0:
                 recent_cut = time.time() - (self.recent_days * 86400)
-                all_files = [p for p in all_files if p.stat().st_mtime >= recent_cut]
+                entries = [e for e in entries if e[1].st_mtime >= recent_cut]
 
             # limit max files
-            if self.max_files and self.max_files > 0 and len(all_files) > self.max_files:
-                all_files = all_files[:self.max_files]
+            if self.max_files and self.max_files > 0 and len(entries) > self.max_files:
+                entries = entries[:self.max_files]
 
             # enqueue only changed (or all if skip_unchanged=False)
             enq = 0
             skipped = 0
-            for p in all_files:
-                if self.skip_unchanged and self._unchanged(str(p)):
+            for p, st in entries:
+                if self.skip_unchanged and self._unchanged(str(p), st):
                     skipped += 1
                     if self.debug: print(f"[GDRIVE] skip unchanged in sync: {p.name}")
                     continue
@@ -303,7 +652,7 @@ class DriveUploader:
 
             if self.debug:
                 print(f"[GDRIVE] sync summary: scanned={total}, "
-                      f"after_recent={len(all_files)+skipped}, enqueued={enq}, skipped={skipped}")
+                      f"after_recent={len(entries)+skipped}, enqueued={enq}, skipped={skipped}")
             self.process_queue()
         except Exception as e:
             print(f"[GDRIVE] sync_local_csvs failed: {e}")
@@ -341,7 +690,10 @@ def gdrive_setup(csv_dir="csv_logs"):
         skip_unchanged=skip_unch, use_md5=use_md5,
     )
     if uploader.enabled and mode in ("at_start","both"):
-        uploader.sync_local_csvs(csv_dir)
+        # scan/hash/upload ตอนเปิดโปรแกรมกินเป็นวินาที-นาที — ย้ายไป daemon thread
+        # ให้ sensor เริ่มเก็บค่าได้ทันที (service แยกต่อ thread อยู่แล้วใน _service)
+        threading.Thread(target=uploader.sync_local_csvs, args=(csv_dir,),
+                         daemon=True, name="gdrive-sync").start()
     return uploader, mode
 
 def gdrive_finalize(uploader_mode_tuple, current_csv_file):
@@ -353,5 +705,7 @@ def gdrive_finalize(uploader_mode_tuple, current_csv_file):
                 uploader.enqueue(current_csv_file)
             # process with a reasonable cap per exit to avoid hanging shutdown
             uploader.process_queue(max_items=25)
+        if uploader:
+            uploader.flush_state()  # กันงานที่ค้างใน memory หายตอนปิด
     except Exception as e:
         print(f"[GDRIVE] finalize failed: {e}")
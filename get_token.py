@@ -1,16 +1,15 @@
 # oauth_token_gen.py
 from __future__ import annotations
-import os
+import os, sys
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
 
 SCOPES = ["https://www.googleapis.com/auth/drive.file"]
 CLIENT_SECRETS = os.environ.get("GDRIVE_OAUTH_CLIENT_SECRETS", "credentials.json")
 TOKEN_PATH = os.environ.get("GDRIVE_TOKEN_PATH", "token.json")
 
 creds = None
+refreshed = False
 if os.path.exists(TOKEN_PATH):
     creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
 
@@ -18,12 +17,21 @@ if not creds or not creds.valid:
     if creds and creds.expired and creds.refresh_token:
         creds.refresh(Request())
     else:
+        # import ตรงนี้พอ — เส้นทางปกติ (token ยังใช้ได้) ไม่ต้องโหลด oauthlib
+        from google_auth_oauthlib.flow import InstalledAppFlow
         flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRETS, SCOPES)
         creds = flow.run_local_server(port=0)
+    refreshed = True
     with open(TOKEN_PATH, "w") as f:
         f.write(creds.to_json())
 
-# quick sanity check
-service = build("drive", "v3", credentials=creds)
-about = service.about().get(fields="user(displayName,emailAddress)").execute()
-print("OK:", about["user"])
+# sanity check เฉพาะตอน token เพิ่งเปลี่ยน หรือขอเองด้วย --verify
+# (เส้นทางปกติไม่ต้องโหลด discovery doc + ยิง about() เปล่า ๆ ทุกครั้งที่รัน)
+if refreshed or "--verify" in sys.argv:
+    from googleapiclient.discovery import build
+    service = build("drive", "v3", credentials=creds,
+                    cache_discovery=False, static_discovery=True)
+    about = service.about().get(fields="user(displayName,emailAddress)").execute()
+    print("OK:", about["user"])
+else:
+    print("OK: token valid (รัน --verify ถ้าอยากยิง API ตรวจซ้ำ)")
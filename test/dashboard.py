@@ -1,13 +1,16 @@
 # -*- coding: utf-8 -*-
 import tkinter as tk
 from tkinter import ttk
-import matplotlib
-matplotlib.rcParams['font.family'] = 'DejaVu Sans'
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import matplotlib.pyplot as plt
-from datetime import datetime
+from collections import deque
+import os
+import queue
+import sys
+import threading
 import time
-import serial
+
+# ไฟล์นี้อยู่ใน test/ — ชี้ path ไปโฟลเดอร์แม่ก่อน import ของกลาง
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from dashboard_common import PMSReader, RelayController, pm25_category
 
 # ================== Serial Config ==================
 INDOOR_PORT = "/dev/ttyAMA0"   # ปรับตามบอร์ด
@@ -20,58 +23,29 @@ ACTIVE_LOW = False
 RELAY_PINS = [17, 18, 27, 22]  # BCM numbering
 RELAY_NAMES = {17: "Purifier", 18: "Fan", 27: "Vent", 22: "Spare"}
 
-# พยายามใช้ gpiozero (รองรับ Pi 5 + lgpio); ตกไป RPi.GPIO; สุดท้าย mock
-try:
-    from gpiozero import DigitalOutputDevice as _GpioZeroDevice, Device
-    try:
-        from gpiozero.pins.lgpio import LGPIOFactory
-        Device.pin_factory = LGPIOFactory()
-        _gpiozero_backend_name = 'lgpio'
-    except Exception:
-        _gpiozero_backend_name = 'auto'
-    _gpiozero_available = True
-except Exception as e:
-    print(f"[WARN] gpiozero not available: {e}")
-    _gpiozero_available = False
-    Device = None
-
-try:
-    import RPi.GPIO as GPIO
-    GPIO.setwarnings(False)
-    _rpi_gpio_available = True
-except Exception as e:
-    print(f"[WARN] RPi.GPIO not available: {e}")
-    _rpi_gpio_available = False
-    GPIO = None
-
 # ================== UI Tunables ==================
 UI_UPDATE_MS = 500          # อัปเดต UI ทุก 0.5s
 CHART_EVERY_N_TICKS = 2     # วาดกราฟทุก 1s (เบาเครื่อง)
 HISTORY_MAX = 120           # เก็บล่าสุด ~60 วินาที (ที่ 0.5s/จุด)
 
 # ================== UI Helpers ==================
-PM25_BANDS = [
-    (0.0, 12.0, "Good", "#2ecc71"),
-    (12.1, 35.4, "Moderate", "#f1c40f"),
-    (35.5, 55.4, "USG", "#e67e22"),
-    (55.5, 150.4, "Unhealthy", "#e74c3c"),
-    (150.5, 250.4, "Very Unhealthy", "#8e44ad"),
-    (250.5, float("inf"), "Hazardous", "#7f0000"),
-]
-def pm25_category(val: float):
-    for lo, hi, label, color in PM25_BANDS:
-        if lo <= val <= hi:
-            return label, color
-    return "-", "#7f8c8d"
-
 class StatCard(ttk.Frame):
     def __init__(self, master, title: str):
         super().__init__(master, padding=10)
         self.columnconfigure(0, weight=1)
         self.title_lbl = ttk.Label(self, text=title, font=("Kanit", 14))
-        self.value_lbl = ttk.Label(self, text="-- µg/m³", font=("Kanit", 26, "bold"))
+        # StringVar.set ถูกกว่า widget.config(text=...) ต่อ tick
+        self.value_var = tk.StringVar(value="-- µg/m³")
+        self.value_lbl = ttk.Label(self, textvariable=self.value_var, font=("Kanit", 26, "bold"))
         self.title_lbl.grid(row=0, column=0, sticky="w")
         self.value_lbl.grid(row=1, column=0, sticky="ew")
+        self._last_text = None
+
+    def set_text(self, txt: str):
+        # ข้อความเท่าเดิม = ไม่ต้องข้ามไป Tcl เลย
+        if txt != self._last_text:
+            self._last_text = txt
+            self.value_var.set(txt)
 
 class PM25Badge(ttk.Frame):
     def __init__(self, master):
@@ -79,18 +53,35 @@ class PM25Badge(ttk.Frame):
         self.columnconfigure(1, weight=1)
         self.bgcolor = "#0F0F1A"
         self.dot = tk.Canvas(self, width=14, height=14, highlightthickness=0, bg=self.bgcolor)
+        # สร้างวงกลมครั้งเดียว แล้วเปลี่ยนเฉพาะสีตอน category เปลี่ยน
+        self._dot_item = self.dot.create_oval(2, 2, 12, 12, fill=self.bgcolor, outline=self.bgcolor)
+        self._last_color = None
         self.label = ttk.Label(self, text="-", font=("Kanit", 12, "bold"))
-        self.bar = ttk.Progressbar(self, orient="horizontal", mode="determinate", maximum=250)
+        # Canvas สองสี่เหลี่ยมแทน ttk.Progressbar — อัปเดตด้วย coords ครั้งเดียว
+        # ไม่ต้องผ่าน theme engine ของ ttk ทุก tick
+        self.bar = tk.Canvas(self, height=10, bg="#1c1c2b", highlightthickness=0)
+        self._bar_fill = self.bar.create_rectangle(0, 0, 0, 10, fill="#00bcd4", outline="")
+        self.bar_max = 250.0
+        self._last_bar_w = None   # ความกว้าง (px) ของแถบที่วาดล่าสุด
         self.dot.grid(row=0, column=0, padx=(0, 8))
         self.label.grid(row=0, column=1, sticky="w")
         self.bar.grid(row=1, column=0, columnspan=2, sticky="ew", pady=(6, 0))
 
     def update_badge(self, value: float):
         text, color = pm25_category(value)
-        self.label.config(text=text)
-        self.bar['value'] = min(max(value, 0), 250)
-        self.dot.delete("all")
-        self.dot.create_oval(2, 2, 12, 12, fill=color, outline=color)
+        w = self.bar.winfo_width()
+        pct = min(max(value, 0), self.bar_max) / self.bar_max
+        fill_w = int(w * pct)
+        if fill_w != self._last_bar_w:
+            # ขยับแถบเฉพาะตอนความกว้างระดับ pixel เปลี่ยนจริง
+            self._last_bar_w = fill_w
+            self.bar.coords(self._bar_fill, 0, 0, fill_w, 10)
+        if color != self._last_color:
+            # ข้อความ/สี category เปลี่ยนพร้อมกันเสมอ — อัปเดตคู่กันเฉพาะตอนข้าม band
+            self.label.config(text=text)
+            self.bar.itemconfig(self._bar_fill, fill=color)
+            self.dot.itemconfig(self._dot_item, fill=color, outline=color)
+            self._last_color = color
 
 class Section(ttk.Labelframe):
     def __init__(self, master, title: str):
@@ -106,167 +97,6 @@ class Section(ttk.Labelframe):
         self.pm10.grid(row=0, column=2, padx=6, pady=6, sticky="nsew")
         self.badge.grid(row=1, column=0, columnspan=3, sticky="ew", padx=6, pady=(0, 6))
 
-# ================== GPIO Relay Controller ==================
-class RelayController:
-    def __init__(self, pins, active_low=True):
-        self.pins = list(pins)
-        self.active_low = bool(active_low)
-        self.states = {p: False for p in pins}
-        self.backend = None
-        self._devices = {}
-        # gpiozero
-        if _gpiozero_available:
-            try:
-                for p in pins:
-                    dev = _GpioZeroDevice(p, active_high=(not self.active_low), initial_value=False)
-                    self._devices[p] = dev
-                self.backend = 'gpiozero'
-                print(f"[GPIO] Using gpiozero backend ({_gpiozero_backend_name})")
-            except Exception as e:
-                print(f"[WARN] gpiozero init failed: {e}")
-                self.backend = None
-        # RPi.GPIO
-        if self.backend is None and _rpi_gpio_available:
-            try:
-                GPIO.setmode(GPIO.BCM)
-                for p in pins:
-                    GPIO.setup(p, GPIO.OUT)
-                for p in pins:
-                    self._apply_pin_rpigpio(p, False)
-                self.backend = 'RPi.GPIO'
-                print('[GPIO] Using RPi.GPIO backend')
-            except Exception as e:
-                print(f"[WARN] RPi.GPIO init failed: {e}")
-                self.backend = None
-        # mock
-        if self.backend is None:
-            self.backend = 'mock'
-            print('[GPIO] Using MOCK backend (no hardware)')
-
-    def _apply_pin_gpiozero(self, pin, state):
-        dev = self._devices.get(pin)
-        if dev:
-            dev.on() if state else dev.off()
-        self.states[pin] = state
-
-    def _apply_pin_rpigpio(self, pin, state):
-        if self.active_low:
-            level = GPIO.LOW if state else GPIO.HIGH
-        else:
-            level = GPIO.HIGH if state else GPIO.LOW
-        GPIO.output(pin, level)
-        self.states[pin] = state
-
-    def _apply_pin(self, pin, state):
-        if self.backend == 'gpiozero':
-            self._apply_pin_gpiozero(pin, state)
-        elif self.backend == 'RPi.GPIO':
-            self._apply_pin_rpigpio(pin, state)
-        else:
-            print(f"[MOCK GPIO] Pin {pin} -> {'ON' if state else 'OFF'}")
-            self.states[pin] = state
-
-    def set(self, pin, state: bool):
-        if pin in self.pins:
-            self._apply_pin(pin, bool(state))
-
-    def toggle(self, pin):
-        self.set(pin, not self.states.get(pin, False))
-
-    def set_all(self, state: bool):
-        for p in self.pins:
-            self._apply_pin(p, bool(state))
-
-    def cleanup(self):
-        try:
-            if self.backend == 'gpiozero':
-                for dev in self._devices.values():
-                    try: dev.off()
-                    except: pass
-                    try: dev.close()
-                    except: pass
-                # สำคัญ: ปิดโรงงานขา ป้องกัน "GPIO busy" บน Pi 5
-                try:
-                    if Device and getattr(Device, "pin_factory", None):
-                        Device.pin_factory.close()
-                except Exception as e:
-                    print(f"[WARN] pin_factory.close() failed: {e}")
-            elif self.backend == 'RPi.GPIO':
-                try:
-                    for p in self.pins:
-                        self._apply_pin_rpigpio(p, False)
-                except Exception: pass
-                try:
-                    GPIO.cleanup()
-                except Exception: pass
-        except Exception:
-            pass
-
-# ================== PMS Reader (non-blocking, ATM) ==================
-class PMSReader:
-    """
-    อ่าน PMSx003/x3005 แบบ non-blocking (timeout=0) แล้ว parse ในบัฟเฟอร์เอง
-    ใช้ค่า Atmospheric (ATM): bytes 10..15 -> PM1/PM2.5/PM10 (big-endian)
-    """
-    def __init__(self, port: str):
-        try:
-            self.ser = serial.Serial(port, baudrate=BAUDRATE, timeout=TIMEOUT)
-            try: self.ser.reset_input_buffer()
-            except: pass
-            self.buf = bytearray()
-            self.last = {"pm1": 0.0, "pm25": 0.0, "pm10": 0.0}
-            self.last_ts = 0.0
-            self.ok = True
-        except Exception as e:
-            print(f"[WARN] Cannot open serial {port}: {e}")
-            self.ser = None
-            self.ok = False
-
-    def _parse_frames(self):
-        i = 0
-        while True:
-            j = self.buf.find(b'\x42\x4D', i)
-            if j < 0:
-                # เก็บท้ายไว้ 1 ไบต์เผื่อหัวเฟรมขาด
-                if len(self.buf) > 1:
-                    self.buf = self.buf[-1:]
-                break
-            if len(self.buf) - j < 32:
-                # รอข้อมูลเพิ่ม
-                if j > 0:
-                    self.buf = self.buf[j:]
-                break
-            frame = self.buf[j:j+32]
-            self.buf = self.buf[j+32:]
-            if frame[0] == 0x42 and frame[1] == 0x4D:
-                pm1  = int.from_bytes(frame[10:12], 'big')
-                pm25 = int.from_bytes(frame[12:14], 'big')
-                pm10 = int.from_bytes(frame[14:16], 'big')
-                self.last = {"pm1": float(pm1), "pm25": float(pm25), "pm10": float(pm10)}
-                self.last_ts = time.time()
-            i = 0
-
-    def poll(self):
-        if not self.ok:
-            return self.last
-        try:
-            n = self.ser.in_waiting
-            if n:
-                self.buf += self.ser.read(n)
-                self._parse_frames()
-        except Exception as e:
-            print(f"[WARN] Serial read error: {e}")
-        return self.last
-
-    def read_once(self):
-        return self.poll()
-
-    def close(self):
-        try:
-            if self.ser: self.ser.close()
-        except Exception:
-            pass
-
 # ================== Main App ==================
 class PMDashboard:
     def __init__(self, root):
@@ -275,9 +105,19 @@ class PMDashboard:
         self.root.geometry("1280x900")
         self._setup_style()
 
-        # Serial readers
-        self.reader_indoor = PMSReader(INDOOR_PORT)
-        self.reader_outdoor = PMSReader(OUTDOOR_PORT)
+        # Serial readers — โพลบน thread แยก UART สะดุดแค่ไหน UI ก็ไม่ค้าง
+        # (Tk แค่หยิบค่าล่าสุดจากคิวขนาด 1)
+        self.reader_indoor = PMSReader(INDOOR_PORT, baudrate=BAUDRATE, timeout=TIMEOUT)
+        self.reader_outdoor = PMSReader(OUTDOOR_PORT, baudrate=BAUDRATE, timeout=TIMEOUT)
+        self._stop_readers = threading.Event()
+        self.q_indoor = queue.Queue(maxsize=1)
+        self.q_outdoor = queue.Queue(maxsize=1)
+        self._last_indoor = dict(self.reader_indoor.last)
+        self._last_outdoor = dict(self.reader_outdoor.last)
+        for reader, q in ((self.reader_indoor, self.q_indoor),
+                          (self.reader_outdoor, self.q_outdoor)):
+            threading.Thread(target=self._reader_loop, args=(reader, q),
+                             daemon=True, name="pms-reader").start()
 
         # Relay controller
         self.relays = RelayController(RELAY_PINS, active_low=ACTIVE_LOW)
@@ -287,6 +127,15 @@ class PMDashboard:
         self.auto_source = tk.StringVar(value="Indoor")  # Indoor/Outdoor
         self.auto_on_threshold = tk.DoubleVar(value=35.0)
         self.auto_hysteresis = tk.DoubleVar(value=5.0)
+        # cache เป็นค่า Python ธรรมดา อัปเดตผ่าน trace ตอนผู้ใช้แก้เท่านั้น
+        # (.get() ข้าม Tcl boundary — ไม่ต้องจ่ายใน _auto_control ทุก tick)
+        self._auto_enabled = False
+        self._auto_src = "Indoor"
+        self._th = 35.0
+        self._hy = 5.0
+        for var in (self.auto_enabled, self.auto_source,
+                    self.auto_on_threshold, self.auto_hysteresis):
+            var.trace_add("write", self._refresh_auto_params)
 
         # Header
         header = ttk.Frame(root, padding=(16, 12))
@@ -305,16 +154,25 @@ class PMDashboard:
         # Relay Control panel
         self._build_relay_panel()
 
-        # Trend Chart
+        # Trend Chart — sparkline บน tk.Canvas (เบากว่า matplotlib หลายสิบเท่าบน Pi)
         chart_frame = ttk.Frame(root, padding=(12, 4)); chart_frame.pack(fill="both", expand=True)
-        self.indoor_history, self.outdoor_history, self.time_history = [], [], []
-        self.fig, self.ax = plt.subplots(figsize=(10, 4), facecolor="#0F0F1A")
-        self.ax.set_facecolor("#0F0F1A")
-        self.ax.tick_params(colors='white')
-        self.ax.set_title("PM2.5 Trend (last ~60s)", color="white", fontsize=14)
-        self.ax.set_ylabel("µg/m³", color="white"); self.ax.set_xlabel("Time", color="white")
-        self.canvas = FigureCanvasTkAgg(self.fig, master=chart_frame)
-        self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        # deque(maxlen=...) ตัดตัวเก่าทิ้งเองตอน append — ไม่มี pop(0) แบบ O(N)
+        self.indoor_history = deque(maxlen=HISTORY_MAX)
+        self.outdoor_history = deque(maxlen=HISTORY_MAX)
+        self.time_history = deque(maxlen=HISTORY_MAX)
+        ttk.Label(chart_frame, text="PM2.5 Trend (last ~60s)", font=("Kanit", 14, "bold")).pack(anchor="w")
+        self.chart = tk.Canvas(chart_frame, bg="#0F0F1A", highlightthickness=0)
+        self.chart.pack(fill="both", expand=True)
+        self.chart_max = 250.0
+        # สร้าง polyline ครั้งเดียว แล้วอัปเดตเฉพาะ coords ทุกรอบวาด
+        self._indoor_line = self.chart.create_line(0, 0, 0, 0, fill="#00bcd4", width=2)
+        self._outdoor_line = self.chart.create_line(0, 0, 0, 0, fill="#e67e22", width=2)
+        self._last_drawn = None   # (ค่าท้ายกราฟปัด int, w, h) ที่วาดไปรอบล่าสุด
+
+        # timestamp cache: format ใหม่เฉพาะตอนวินาทีเปลี่ยน (tick ถี่กว่าวินาที)
+        self._last_now_s = 0
+        self._ts_full = ""
+        self._ts_hms = ""
 
         # Safe timer: ตัวเดียวถาวร
         self._running = True
@@ -344,9 +202,15 @@ class PMDashboard:
         panel = ttk.Labelframe(self.root, text="Relay Control", padding=12); panel.pack(fill="x", padx=12, pady=6)
         for i in range(len(RELAY_PINS) + 4): panel.columnconfigure(i, weight=1)
         self.relay_btns = {}
+        self._btn_text = {}   # pin -> (ข้อความ ON, ข้อความ OFF) ฟอร์แมตไว้ล่วงหน้า
+        self._btn_var = {}
+        self._last_btn_state = {pin: False for pin in RELAY_PINS}  # ปุ่มเริ่มที่ OFF
         for idx, pin in enumerate(RELAY_PINS):
             name = RELAY_NAMES.get(pin, f"Pin {pin}")
-            b = ttk.Button(panel, text=f"{name} (Pin {pin}): OFF", command=lambda p=pin: self._toggle_relay(p))
+            prefix = f"{name} (Pin {pin}): "
+            self._btn_text[pin] = (prefix + "ON", prefix + "OFF")
+            self._btn_var[pin] = tk.StringVar(value=self._btn_text[pin][1])
+            b = ttk.Button(panel, textvariable=self._btn_var[pin], command=lambda p=pin: self._toggle_relay(p))
             b.grid(row=0, column=idx, padx=6, pady=6, sticky="ew"); self.relay_btns[pin] = b
         ttk.Button(panel, text="All ON", command=lambda: self._set_all_relays(True)).grid(row=0, column=len(RELAY_PINS), padx=6, pady=6, sticky="ew")
         ttk.Button(panel, text="All OFF", command=lambda: self._set_all_relays(False)).grid(row=0, column=len(RELAY_PINS)+1, padx=6, pady=6, sticky="ew")
@@ -361,6 +225,24 @@ class PMDashboard:
         ttk.Label(auto, text="Hysteresis (µg/m³):").grid(row=0, column=5, sticky="e", padx=(12,4))
         ttk.Spinbox(auto, from_=0, to=100, increment=1, textvariable=self.auto_hysteresis, width=6).grid(row=0, column=6, sticky="w")
         self.auto_state_lbl = ttk.Label(auto, text="Auto state: idle"); self.auto_state_lbl.grid(row=0, column=9, sticky="e")
+        self._auto_last_txt = "Auto state: idle"
+        self._auto_last_t = 0.0
+
+    # ---------- Serial reader thread ----------
+    def _reader_loop(self, reader, q):
+        """producer: รอข้อมูลจริงด้วย select แล้ววางค่าล่าสุดลงคิว (เก็บตัวเดียว)"""
+        while not self._stop_readers.is_set():
+            if not reader.wait(0.5):
+                continue  # หมดเวลารอ/พอร์ตใช้ไม่ได้ — วนเช็ค stop flag
+            data = reader.read_once()
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                q.put_nowait(dict(data))
+            except queue.Full:
+                pass
 
     # ---------- Timer driver ----------
     def _on_timer(self):
@@ -376,6 +258,15 @@ class PMDashboard:
                 except Exception:
                     pass
 
+    def _refresh_auto_params(self, *args):
+        self._auto_enabled = bool(self.auto_enabled.get())
+        self._auto_src = self.auto_source.get()
+        try:
+            self._th = float(self.auto_on_threshold.get())
+            self._hy = float(self.auto_hysteresis.get())
+        except (tk.TclError, ValueError):
+            pass  # พิมพ์ค้างกลางคัน — ใช้ค่าเดิมไปก่อน
+
     # ---------- Relay helpers ----------
     def _toggle_relay(self, pin):
         self.relays.toggle(pin); self._refresh_relay_text(pin)
@@ -385,22 +276,38 @@ class PMDashboard:
         for pin in RELAY_PINS: self._refresh_relay_text(pin)
 
     def _refresh_relay_text(self, pin):
-        state = self.relays.states.get(pin, False); name = RELAY_NAMES.get(pin, f"Pin {pin}")
-        self.relay_btns[pin].config(text=f"{name} (Pin {pin}): {'ON' if state else 'OFF'}")
+        state = self.relays.states.get(pin, False)
+        if state == self._last_btn_state.get(pin):
+            return  # ปุ่มแสดงสถานะนี้อยู่แล้ว
+        self._last_btn_state[pin] = state
+        self._btn_var[pin].set(self._btn_text[pin][0 if state else 1])
 
     # ---------- Sensor/Chart update ----------
     def _update_cards(self, section, data: dict):
-        section.pm1.value_lbl.config(text=f"{data['pm1']:.1f} µg/m³")
-        section.pm25.value_lbl.config(text=f"{data['pm25']:.1f} µg/m³")
-        section.pm10.value_lbl.config(text=f"{data['pm10']:.1f} µg/m³")
+        section.pm1.set_text(f"{data['pm1']:.1f} µg/m³")
+        section.pm25.set_text(f"{data['pm25']:.1f} µg/m³")
+        section.pm10.set_text(f"{data['pm10']:.1f} µg/m³")
         section.badge.update_badge(data['pm25'])
 
     def update_data(self):
-        indoor = self.reader_indoor.read_once()
-        outdoor = self.reader_outdoor.read_once()
+        try:
+            self._last_indoor = self.q_indoor.get_nowait()
+        except queue.Empty:
+            pass
+        try:
+            self._last_outdoor = self.q_outdoor.get_nowait()
+        except queue.Empty:
+            pass
+        indoor = self._last_indoor
+        outdoor = self._last_outdoor
 
-        ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.last_lbl.config(text=f"Last update: {ts}")
+        # strftime ครั้งเดียวต่อวินาที แล้ว slice เอา HH:MM:SS จากสตริงเดียวกัน
+        now_s = int(time.time())
+        if now_s != self._last_now_s:
+            self._last_now_s = now_s
+            self._ts_full = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(now_s))
+            self._ts_hms = self._ts_full[11:]
+            self.last_lbl.config(text=f"Last update: {self._ts_full}")
 
         self._update_cards(self.indoor, indoor)
         self._update_cards(self.outdoor, outdoor)
@@ -409,69 +316,77 @@ class PMDashboard:
         self._auto_control(indoor, outdoor)
 
         # History for chart
-        current_time = datetime.now().strftime("%H:%M:%S")
-        self.time_history.append(current_time)
+        self.time_history.append(self._ts_hms)
         self.indoor_history.append(indoor['pm25'])
         self.outdoor_history.append(outdoor['pm25'])
-        if len(self.time_history) > HISTORY_MAX:
-            self.time_history.pop(0); self.indoor_history.pop(0); self.outdoor_history.pop(0)
 
         # Draw chart every N ticks (ลดภาระ)
-        # ----- วางแทนบล็อควาดกราฟเดิมใน update_data() -----
         self._tick += 1
         if self._tick % CHART_EVERY_N_TICKS == 0:
-            self.ax.clear()
-            self.ax.set_facecolor("#0F0F1A")
-            self.ax.tick_params(colors='white')
-            self.ax.grid(True, linestyle='--', alpha=0.3, color="#555555")
-            self.ax.set_title("PM2.5 Trend (last ~60s)", color="white", fontsize=14)
-            self.ax.set_ylabel("µg/m³", color="white")
-            self.ax.set_xlabel("Time", color="white")
-
-            # 1) ใช้แกน X เป็น index 0..N-1 เพื่อคุม tick ได้แม่น
-            x = list(range(len(self.time_history)))
-
-            # 2) วาดเส้น ลด marker ให้ขึ้นทุก k จุด (อ่านง่ายกว่า)
-            MARK_EVERY = 6  # แสดง marker ทุก ~3 วินาที (ที่ 0.5s/จุด)
-            self.ax.plot(x, self.indoor_history, linewidth=2, label="Indoor",
-                        marker="o", markevery=MARK_EVERY, markersize=4)
-            self.ax.plot(x, self.outdoor_history, linewidth=2, label="Outdoor",
-                        marker="o", markevery=MARK_EVERY, markersize=4)
-
-            # 3) จำกัดจำนวนฉลากแกน X (เช่น 8 ช่อง)
-            n = len(x)
-            if n > 0:
-                TICKS = min(8, n)                          # จำนวนฉลากที่ต้องการ
-                if TICKS == 1:
-                    idxs = [0]
-                else:
-                    idxs = [round(i*(n-1)/(TICKS-1)) for i in range(TICKS)]
-                self.ax.set_xticks(idxs)
-                self.ax.set_xticklabels([self.time_history[i] for i in idxs],
-                                        rotation=0, ha='center', color='white')
-
-            self.ax.legend(facecolor="#0F0F1A", edgecolor="white",
-                        fontsize=10, labelcolor="white")
-            self.ax.margins(x=0)  # ไม่ให้เหลือขอบซ้าย/ขวาเยอะ
-            self.canvas.draw_idle()
+            self._draw_chart()
+
+    def _series_coords(self, series, w, h):
+        """แปลงค่า PM เป็นพิกัด polyline (scale คงที่ 0..chart_max)"""
+        if len(series) < 2:
+            return (0, h, 0, h)
+        step = w / (HISTORY_MAX - 1)
+        scale = h / self.chart_max
+        pts = []
+        for i, v in enumerate(series):
+            pts.append(i * step)
+            pts.append(h - min(max(v, 0.0), self.chart_max) * scale)
+        return pts
+
+    def _draw_chart(self):
+        w = self.chart.winfo_width(); h = self.chart.winfo_height()
+        if w <= 1 or h <= 1:
+            return
+        # dirty gate: หน้าต่างเต็มแล้ว + ทั้งเส้นแบนราบ + ค่าท้ายไม่ขยับ
+        # = scroll ไปก็เห็นภาพเดิมเป๊ะ ข้ามการวาดได้เลย (เคสอากาศนิ่ง ๆ)
+        n = len(self.indoor_history)
+        tail = ((round(self.indoor_history[-1]), round(self.outdoor_history[-1]))
+                if n else (None, None))
+        # ผูกขนาด canvas เข้า key ด้วย — resize ตอนกราฟนิ่งต้องวาดใหม่
+        # ไม่งั้นเส้นค้าง scale เก่าจนกว่าค่าจะขยับ
+        key = (tail, w, h)
+        if (key == self._last_drawn and n == HISTORY_MAX
+                and min(self.indoor_history) == max(self.indoor_history)
+                and min(self.outdoor_history) == max(self.outdoor_history)):
+            return
+        self._last_drawn = key
+        # แค่ย้าย coords ของเส้นเดิม ไม่มีการสร้าง/ลบ item
+        self.chart.coords(self._indoor_line, *self._series_coords(self.indoor_history, w, h))
+        self.chart.coords(self._outdoor_line, *self._series_coords(self.outdoor_history, w, h))
+
 
+    def _set_auto_state(self, txt):
+        """เขียนป้ายสถานะ auto ไม่เกิน 1 ครั้ง/วินาที และข้ามข้อความซ้ำเดิม"""
+        now = time.monotonic()
+        if txt == self._auto_last_txt or now - self._auto_last_t < 1.0:
+            return
+        self._auto_last_txt = txt
+        self._auto_last_t = now
+        self.auto_state_lbl.config(text=txt)
 
     def _auto_control(self, indoor, outdoor):
-        if not self.auto_enabled.get():
-            self.auto_state_lbl.config(text="Auto state: idle"); return
-        source = self.auto_source.get()
+        if not self._auto_enabled:
+            self._set_auto_state("Auto state: idle"); return
+        source = self._auto_src
         pm = indoor['pm25'] if source == 'Indoor' else outdoor['pm25']
-        on_th = float(self.auto_on_threshold.get()); hyster = float(self.auto_hysteresis.get())
+        on_th = self._th; hyster = self._hy
         off_th = max(0.0, on_th - hyster)
-        currently_on = any(self.relays.states.values())
+        currently_on = self.relays.any_on
         desired_on = (pm >= on_th) if not currently_on else (pm >= off_th)
-        self.relays.set_all(desired_on)
-        for pin in RELAY_PINS: self._refresh_relay_text(pin)
-        self.auto_state_lbl.config(text=f"Auto state: {'ON' if desired_on else 'OFF'} | {source} PM2.5={pm:.1f} ≥ {on_th:.1f} (ON) / < {off_th:.1f} (OFF)")
+        if desired_on != currently_on:
+            # สั่ง GPIO/รีเฟรชปุ่มเฉพาะตอนสถานะเปลี่ยนจริง
+            self.relays.set_all(desired_on)
+            for pin in RELAY_PINS: self._refresh_relay_text(pin)
+        self._set_auto_state(f"Auto state: {'ON' if desired_on else 'OFF'} | {source} PM2.5={pm:.1f} ≥ {on_th:.1f} (ON) / < {off_th:.1f} (OFF)")
 
     def on_close(self):
         # ยกเลิก timer ก่อน
         self._running = False
+        self._stop_readers.set()
         if getattr(self, "job", None) is not None:
             try:
                 self.root.after_cancel(self.job)
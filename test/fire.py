@@ -1,14 +1,28 @@
-import os, datetime as dt, firebase_admin
-from firebase_admin import credentials, db
+import os, datetime as dt
+from google.oauth2 import service_account
+from google.auth.transport.requests import AuthorizedSession
 
-cred = credentials.Certificate(os.getenv("FIREBASE_CREDENTIALS", "firebase-adminsdk.json"))
-firebase_admin.initialize_app(cred, {"databaseURL": os.environ["FIREBASE_RTDB_URL"]})
+# เขียนตรงผ่าน REST ของ RTDB แทน firebase_admin:
+# ไม่ต้องจ่ายค่า initialize_app (~0.5-1 วิ) เพื่อแค่ push เดียว + get เดียว
+SCOPES = ["https://www.googleapis.com/auth/userinfo.email",
+          "https://www.googleapis.com/auth/firebase.database"]
+
+creds = service_account.Credentials.from_service_account_file(
+    os.getenv("FIREBASE_CREDENTIALS", "firebase-adminsdk.json"), scopes=SCOPES)
+base = os.environ["FIREBASE_RTDB_URL"].rstrip("/")
+
+# session เดียวใช้ซ้ำได้ทุก request: เติม Bearer token ให้เอง (refresh เมื่อหมดอายุ)
+# และคง TLS connection เดิมไว้ — ไม่ต้อง handshake ใหม่ต่อ write
+session = AuthorizedSession(creds)
 
-ref = db.reference("/pm_readings/quicktest")
 payload = {"ts": dt.datetime.utcnow().isoformat(timespec="seconds")+"Z",
            "sensor":"indoor", "pm1":7.0, "pm25":10.0, "pm10":12.0}
-ref.push(payload)  # เขียน 1 แถว
-print("WRITE OK")
+r = session.post(f"{base}/pm_readings/quicktest.json", json=payload)  # push = POST
+r.raise_for_status()
+print("WRITE OK", r.json()["name"])
 
 # อ่านแถวล่าสุดกลับมาดู
-print("READ ->", ref.order_by_key().limit_to_last(1).get())
+r = session.get(f"{base}/pm_readings/quicktest.json",
+                params={"orderBy": '"$key"', "limitToLast": 1})
+r.raise_for_status()
+print("READ ->", r.json())
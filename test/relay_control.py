@@ -1,24 +1,39 @@
-import RPi.GPIO as GPIO
-import time
+import lgpio
 
 # กำหนดขา GPIO ที่จะใช้ (เช่น 4 ขา)
 RELAY_PINS = [17, 18, 27, 22]
+ACTIVE_LOW = True  # relay บอร์ดนี้ active-low (LOW = เปิด)
 
-# ตั้งค่า GPIO
-GPIO.setmode(GPIO.BCM)
-for pin in RELAY_PINS:
-    GPIO.setup(pin, GPIO.OUT)
-    GPIO.output(pin, GPIO.HIGH)  # เริ่มต้นปิด relay
+_OFF = 1 if ACTIVE_LOW else 0
+_ON = 1 - _OFF
+_MASK = (1 << len(RELAY_PINS)) - 1
+
+# เปิด chip แล้ว claim ทั้งกลุ่มรอบเดียว เริ่มต้นปิดทุกตัว
+# หลังจากนี้ทุกคำสั่งเขียนเป็น syscall เดียว ไม่ผ่าน object ต่อขาแบบ gpiozero
+_h = lgpio.gpiochip_open(0)
+lgpio.group_claim_output(_h, RELAY_PINS, [_OFF] * len(RELAY_PINS))
 
 def relay_on(index):
     """เปิด relay ตาม index (0-3)"""
-    GPIO.output(RELAY_PINS[index], GPIO.LOW)  # relay active-low
+    lgpio.gpio_write(_h, RELAY_PINS[index], _ON)
     print(f"Relay {index+1} ON")
 
 def relay_off(index):
     """ปิด relay ตาม index (0-3)"""
-    GPIO.output(RELAY_PINS[index], GPIO.HIGH)
+    lgpio.gpio_write(_h, RELAY_PINS[index], _OFF)
     print(f"Relay {index+1} OFF")
 
+def all_on():
+    """เปิดทุกตัวพร้อมกันด้วย group_write ครั้งเดียว"""
+    lgpio.group_write(_h, RELAY_PINS[0], _MASK * _ON, _MASK)
+    print("Relay ALL ON")
+
+def all_off():
+    """ปิดทุกตัวพร้อมกันด้วย group_write ครั้งเดียว"""
+    lgpio.group_write(_h, RELAY_PINS[0], _MASK * _OFF, _MASK)
+    print("Relay ALL OFF")
+
 def cleanup():
-    GPIO.cleanup()
+    all_off()
+    lgpio.group_free(_h, RELAY_PINS[0])
+    lgpio.gpiochip_close(_h)
@@ -1,6 +1,10 @@
 import serial
+import struct
 import time
 
+# ATM PM1.0/PM2.5/PM10 สามค่า big-endian — unpack ครั้งเดียวแทน shift ทีละไบต์
+_PMS_ATM = struct.Struct(">HHH")
+
 # PMS3005 ตัวแรก: UART0
 ser1 = serial.Serial('/dev/ttyAMA0', baudrate=9600, timeout=2)
 
@@ -8,19 +12,18 @@ ser1 = serial.Serial('/dev/ttyAMA0', baudrate=9600, timeout=2)
 ser2 = serial.Serial('/dev/ttyAMA2', baudrate=9600, timeout=2)
 
 def read_pms(ser):
-    start_time = time.time()
-    while ser.in_waiting < 32:
-        if time.time() - start_time > 3:  # Timeout 3 วินาที
-            return None
-        time.sleep(0.1)
-
-    data = ser.read(32)
-
-    if len(data) == 32 and data[0] == 0x42 and data[1] == 0x4D:
-        pm1_0 = (data[10] << 8) | data[11]
-        pm2_5 = (data[12] << 8) | data[13]
-        pm10  = (data[14] << 8) | data[15]
-        return pm1_0, pm2_5, pm10
+    # ให้ pyserial วนหา header 0x42 0x4D ในระดับ C แทน loop Python
+    # (อาศัย timeout ของพอร์ต แล้วเช็กความยาว buffer ที่ได้กลับมาเอง)
+    preamble = ser.read_until(b'\x42\x4D', 64)
+    if not preamble.endswith(b'\x42\x4D'):
+        return None
+
+    # เหลืออีก 30 bytes หลัง header (frame เต็ม 32 bytes)
+    data = ser.read(30)
+
+    if len(data) == 30:
+        # ATM PM1.0/PM2.5/PM10 = bytes 10..15 ของ frame เต็ม => 8..13 หลัง header
+        return _PMS_ATM.unpack_from(data, 8)
     return None
 
 